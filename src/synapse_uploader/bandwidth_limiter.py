@@ -0,0 +1,167 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from .utils import Utils
+
+
+class BandwidthLimiter:
+    """Token bucket that limits the upload bytes per second across all the upload threads.
+
+    The limit can change by time of day and at runtime through a control file. Only the uploaded file
+    content is limited, metadata requests are never held up by the limiter.
+    """
+    UNLIMITED_VALUES = ['', 'unlimited', 'off', 'none']
+
+    # How often the control file is checked for changes, and how often a paused limiter checks the limit.
+    CHECK_INTERVAL = 1
+
+    def __init__(self, rate=None, schedule=None, control_file=None):
+        """
+        Args:
+            rate: The default limit in bytes per second. None for unlimited, 0 to pause.
+            schedule: List of (start_minute, end_minute, rate) time of day windows that override the default limit.
+                The first window containing the current time is used.
+            control_file: Path to a file containing a limit (e.g., 10M or unlimited). When the file exists it
+                overrides the default limit and the schedule. The file can be changed while uploading.
+        """
+        self._rate = rate
+        self._schedule = schedule or []
+        self._control_file = control_file
+        self._lock = threading.Lock()
+        self._tokens = 0
+        self._last_time = time.monotonic()
+        self._current_rate = rate
+        self._control_rate = None
+        self._control_mtime = None
+        self._control_checked = None
+
+    @property
+    def enabled(self):
+        """Gets if the limiter can limit anything."""
+        return self._rate is not None or bool(self._schedule) or bool(self._control_file)
+
+    def acquire(self, size):
+        """Waits until size bytes can be sent."""
+        if not self.enabled:
+            return
+
+        while True:
+            with self._lock:
+                rate = self._get_rate()
+                now = time.monotonic()
+                if rate is None:
+                    self._last_time = now
+                    return
+
+                if rate > 0:
+                    # Allow bursts of up to one second of the limit, larger sizes go into debt and wait.
+                    self._tokens = min(self._tokens + (now - self._last_time) * rate, rate)
+                    self._last_time = now
+                    self._tokens -= size
+                    wait_time = -self._tokens / rate
+                    break
+
+                self._last_time = now
+                self._tokens = 0
+
+            time.sleep(self.CHECK_INTERVAL)
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def get_rate(self):
+        """Gets the current limit in bytes per second, None when unlimited."""
+        with self._lock:
+            return self._get_rate()
+
+    def _get_rate(self):
+        rate = self._rate
+
+        now = datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start_minute, end_minute, window_rate in self._schedule:
+            if self._in_window(minute, start_minute, end_minute):
+                rate = window_rate
+                break
+
+        if self._control_file:
+            self._check_control_file()
+            if self._control_mtime is not None:
+                rate = self._control_rate
+
+        if rate != self._current_rate:
+            logging.info('Bandwidth limit: {0}'.format(self.format_rate(rate)))
+            self._current_rate = rate
+
+        return rate
+
+    def _check_control_file(self):
+        now = time.monotonic()
+        if self._control_checked is not None and now - self._control_checked < self.CHECK_INTERVAL:
+            return
+        self._control_checked = now
+
+        try:
+            mtime = os.stat(self._control_file).st_mtime
+        except OSError:
+            self._control_mtime = None
+            return
+
+        if mtime == self._control_mtime:
+            return
+
+        try:
+            with open(self._control_file, mode='r') as fd:
+                self._control_rate = self.parse_rate(fd.read())
+            self._control_mtime = mtime
+        except (OSError, ValueError) as ex:
+            logging.warning('Cannot read bandwidth limit from: {0} : {1}'.format(self._control_file, str(ex)))
+
+    @staticmethod
+    def _in_window(minute, start_minute, end_minute):
+        if start_minute <= end_minute:
+            return start_minute <= minute < end_minute
+        # The window wraps past midnight.
+        return minute >= start_minute or minute < end_minute
+
+    @staticmethod
+    def parse_rate(value):
+        """Parses a limit in bytes per second (e.g., 500K, 10M), unlimited, or 0 to pause.
+
+        Returns:
+            The limit in bytes per second, None for unlimited.
+        """
+        if str(value).strip().lower() in BandwidthLimiter.UNLIMITED_VALUES:
+            return None
+        return Utils.parse_size(str(value).strip())
+
+    @staticmethod
+    def parse_window(value):
+        """Parses a time of day window with a limit (e.g., 08:00-18:00=5M or 22:00-06:00=unlimited).
+
+        Returns:
+            Tuple of the start minute, end minute, and limit in bytes per second (None for unlimited).
+        """
+        match = re.fullmatch(r'\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=(.*)', str(value))
+        if not match:
+            raise ValueError('Invalid window: {0}'.format(value))
+
+        start_hour, start_minute, end_hour, end_minute = [int(g) for g in match.groups()[:4]]
+        if start_hour > 24 or end_hour > 24 or start_minute > 59 or end_minute > 59:
+            raise ValueError('Invalid window: {0}'.format(value))
+
+        return start_hour * 60 + start_minute, end_hour * 60 + end_minute, BandwidthLimiter.parse_rate(match.group(5))
+
+    @staticmethod
+    def format_rate(rate):
+        if rate is None:
+            return 'unlimited'
+        if rate == 0:
+            return 'paused'
+        for unit in ['T', 'G', 'M', 'K']:
+            if rate >= Utils.SIZE_UNITS[unit]:
+                return '{0:.1f} {1}B/s'.format(rate / Utils.SIZE_UNITS[unit], unit)
+        return '{0} B/s'.format(rate)
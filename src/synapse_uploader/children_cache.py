@@ -0,0 +1,119 @@
+import sys
+import threading
+import collections
+import concurrent.futures
+from .utils import Utils
+
+
+class ChildrenCache:
+    """Memory-bounded cache of the child names and IDs of Synapse containers.
+
+    Listings are streamed page by page into compact name -> ID maps of the files and the folders instead of
+    keeping the full child metadata. Threads getting the same container at the same time share one listing.
+    The least recently used listings are evicted when the estimated size of the cached listings is over max_bytes.
+    """
+    DEFAULT_MAX_BYTES = 64 * Utils.MB
+
+    FOLDER_TYPE = 'org.sagebionetworks.repo.model.Folder'
+
+    # Estimated bytes per entry in addition to the name and ID strings (dict slot and hash table growth).
+    ENTRY_OVERHEAD = 100
+
+    def __init__(self, list_fn, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            list_fn: Function that takes a container ID and returns an iterable of child metadata dicts.
+            max_bytes: The estimated size in bytes the cached listings are kept under.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._list_fn = list_fn
+        self._lock = threading.Lock()
+        # Container ID -> (files, folders, size) in least recently used order.
+        self._listings = collections.OrderedDict()
+        self._in_flight = {}
+
+    def get(self, parent_id):
+        """Gets the child files of a container.
+
+        Returns:
+            Dict of child name -> child ID. The dict must not be modified.
+        """
+        return self.get_listing(parent_id)[0]
+
+    def get_folders(self, parent_id):
+        """Gets the child folders of a container.
+
+        Returns:
+            Dict of child name -> child ID. The dict must not be modified.
+        """
+        return self.get_listing(parent_id)[1]
+
+    def set_empty(self, parent_id):
+        """Caches an empty listing for a container that was just created so it is never listed."""
+        files = {}
+        folders = {}
+        size = sys.getsizeof(files) + sys.getsizeof(folders)
+        with self._lock:
+            if parent_id not in self._listings and parent_id not in self._in_flight:
+                self._add_listing(parent_id, files, folders, size)
+
+    def get_listing(self, parent_id):
+        """Gets the child files and folders of a container.
+
+        Returns:
+            Tuple of the dicts of child file name -> ID and child folder name -> ID. The dicts must not be modified.
+        """
+        with self._lock:
+            listing = self._listings.get(parent_id, None)
+            if listing is not None:
+                self._listings.move_to_end(parent_id)
+                return listing[:2]
+
+            listing_future = self._in_flight.get(parent_id, None)
+            is_loader = listing_future is None
+            if is_loader:
+                listing_future = concurrent.futures.Future()
+                self._in_flight[parent_id] = listing_future
+
+        if not is_loader:
+            return listing_future.result()
+
+        try:
+            files = {}
+            folders = {}
+            size = sys.getsizeof(files) + sys.getsizeof(folders)
+            for child in self._list_fn(parent_id):
+                name = child['name']
+                child_id = child['id']
+                if child.get('type', None) == self.FOLDER_TYPE:
+                    folders[name] = child_id
+                else:
+                    files[name] = child_id
+                size += sys.getsizeof(name) + sys.getsizeof(child_id) + self.ENTRY_OVERHEAD
+        except Exception as ex:
+            with self._lock:
+                self._in_flight.pop(parent_id, None)
+            listing_future.set_exception(ex)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(parent_id, None)
+            self._add_listing(parent_id, files, folders, size)
+
+        listing_future.set_result((files, folders))
+        return files, folders
+
+    def _add_listing(self, parent_id, files, folders, size):
+        """Adds a listing and evicts the least recently used listings over the budget. Called with the lock held."""
+        # Listings over the whole budget are used once and not cached.
+        if size <= self.max_bytes:
+            self._listings[parent_id] = (files, folders, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self._listings.popitem(last=False)
+                self.size -= evicted_size
+
+    def __contains__(self, parent_id):
+        with self._lock:
+            return parent_id in self._listings
@@ -5,6 +5,10 @@ import argparse
 from datetime import datetime
 from ._version import __version__
 from .synapse_uploader import SynapseUploader
+from .upload_scheduler import UploadScheduler
+from .path_filter import PathFilter
+from .bandwidth_limiter import BandwidthLimiter
+from .manifest_writer import ManifestWriter
 from .utils import Utils
 from synapsis import cli as synapsis_cli
 
@@ -12,8 +16,7 @@ from synapsis import cli as synapsis_cli
 class LogFilter(logging.Filter):
     FILTERS = [
         '##################################################',
-        'Uploading file to Synapse storage',
-        'Connection pool is full, discarding connection:'
+        'Uploading file to Synapse storage'
     ]
 
     def filter(self, record):
@@ -35,6 +38,54 @@ def main():
                         metavar='local-path',
                         help='Path of the directory or file to upload.')
 
+    parser.add_argument('--files-from',
+                        help='Only upload the files listed in this file (or "-" for stdin). '
+                             'Paths are relative to local-path.',
+                        default=None)
+
+    parser.add_argument('-0', '--null',
+                        help='The paths in --files-from are separated by NUL characters instead of newlines.',
+                        default=False,
+                        action='store_true')
+
+    parser.add_argument('--exclude',
+                        help='Do not upload files or directories matching this .gitignore style pattern '
+                             '(e.g., "__pycache__/" or "*.tmp"). Can be used multiple times.',
+                        action='append',
+                        default=None)
+
+    parser.add_argument('--exclude-from',
+                        help='Read exclude patterns from this .gitignore style file.',
+                        default=None)
+
+    parser.add_argument('--include',
+                        help='Only upload files matching this .gitignore style pattern (e.g., "*.bam"), or in a '
+                             'directory matching it (e.g., "results/"). Can be used multiple times.',
+                        action='append',
+                        default=None)
+
+    parser.add_argument('--min-size',
+                        help='Only upload files of at least this size (e.g., 1K).',
+                        type=Utils.parse_size,
+                        default=None)
+
+    parser.add_argument('--max-size',
+                        help='Only upload files of at most this size (e.g., 10G).',
+                        type=Utils.parse_size,
+                        default=None)
+
+    parser.add_argument('--newer-than',
+                        help='Only upload files modified at or after this date/time (e.g., 2024-01-31) '
+                             'or within this age (e.g., 12h or 7d).',
+                        type=Utils.parse_time,
+                        default=None)
+
+    parser.add_argument('--older-than',
+                        help='Only upload files modified before this date/time (e.g., 2024-01-31T12:00:00) '
+                             'or longer ago than this age (e.g., 30m or 2w).',
+                        type=Utils.parse_time,
+                        default=None)
+
     parser.add_argument('-r', '--remote-folder-path',
                         help='Folder to upload to in Synapse.',
                         default=None)
@@ -49,6 +100,28 @@ def main():
                         type=int,
                         default=None)
 
+    parser.add_argument('--max-connections',
+                        help='The maximum number of HTTP connections to keep open per host. Defaults to enough for the threads.',
+                        type=int,
+                        default=None)
+
+    parser.add_argument('--bwlimit',
+                        help='Limit the upload bandwidth to this many bytes per second (e.g., 10M).',
+                        type=BandwidthLimiter.parse_rate,
+                        default=None)
+
+    parser.add_argument('--bwlimit-window',
+                        help='Limit the upload bandwidth during a time of day (e.g., 08:00-18:00=5M or '
+                             '22:00-06:00=unlimited). Can be used multiple times, the first matching window is used.',
+                        type=BandwidthLimiter.parse_window,
+                        action='append',
+                        default=None)
+
+    parser.add_argument('--bwlimit-file',
+                        help='File containing a bandwidth limit (e.g., 10M, 0 to pause, or unlimited) that overrides '
+                             'the other limits while it exists. Changes take effect while uploading.',
+                        default=None)
+
     parser.add_argument('-ll', '--log-level',
                         help='Set the logging level.',
                         default='INFO')
@@ -63,6 +136,62 @@ def main():
     parser.add_argument('-cd', '--cache-dir',
                         help='Set the directory where the Synapse cache will be stored.')
 
+    parser.add_argument('-m', '--mirror',
+                        help='Move remote files in Synapse that were moved or renamed locally instead of re-uploading them.',
+                        default=False,
+                        action='store_true')
+
+    parser.add_argument('--trash',
+                        help='When mirroring, move remote files and folders that no longer exist locally to the Synapse trash.',
+                        default=False,
+                        action='store_true')
+
+    parser.add_argument('--pack-threshold',
+                        help='Pack files smaller than this size (e.g., 64K) into tar archives instead of uploading them individually.',
+                        type=Utils.parse_size,
+                        default=None)
+
+    parser.add_argument('--pack-size',
+                        help='The target size of each tar archive small files are packed into (e.g., 1G).',
+                        type=Utils.parse_size,
+                        default=SynapseUploader.DEFAULT_PACK_SIZE)
+
+    parser.add_argument('--order',
+                        help='The order files waiting to upload are uploaded in. Defaults to name.',
+                        choices=UploadScheduler.ORDERS,
+                        default=UploadScheduler.ORDER_NAME)
+
+    parser.add_argument('--priority',
+                        help='Upload files matching this glob pattern (e.g., "*.json" or "results/*") first. '
+                             'Can be used multiple times, earlier patterns go first.',
+                        action='append',
+                        default=None)
+
+    parser.add_argument('--fair',
+                        help='Take turns uploading files from each top-level directory.',
+                        default=False,
+                        action='store_true')
+
+    parser.add_argument('--manifest',
+                        help='Write a record of each file (local path, size, MD5, Synapse ID, version, parent ID, status, '
+                             'and timing) to this file as the uploads finish.',
+                        default=None)
+
+    parser.add_argument('--manifest-format',
+                        help='The manifest format. Defaults to csv for .csv files and jsonl otherwise.',
+                        choices=ManifestWriter.FORMATS,
+                        default=None)
+
+    parser.add_argument('--profile',
+                        help='Log the time spent in each stage (scan, hash, lookup, upload, etc.) and write it next to the log file.',
+                        default=False,
+                        action='store_true')
+
+    parser.add_argument('--profile-stacks',
+                        help='Sample the thread stacks and write them next to the log file in the collapsed flame graph format.',
+                        default=False,
+                        action='store_true')
+
     args = parser.parse_args()
 
     log_level = getattr(logging, args.log_level.upper())
@@ -97,7 +226,17 @@ def main():
 
     print('Logging output to: {0}'.format(log_filename))
 
+    log_basename = os.path.splitext(log_filename)[0]
+    profile_path = '{0}.profile.txt'.format(log_basename) if args.profile else None
+    profile_stacks_path = '{0}.stacks.txt'.format(log_basename) if args.profile_stacks else None
+
     try:
+        excludes = []
+        if args.exclude_from:
+            excludes.extend(PathFilter.read_patterns(Utils.expand_path(args.exclude_from)))
+        if args.exclude:
+            excludes.extend(args.exclude)
+
         cache_dir = args.cache_dir
         if cache_dir:
             cache_dir = os.path.join(cache_dir, '.synapseCache')
@@ -109,7 +248,30 @@ def main():
             remote_path=args.remote_folder_path,
             max_depth=args.depth,
             max_threads=args.threads,
-            force_upload=args.force_upload
+            force_upload=args.force_upload,
+            mirror=args.mirror,
+            trash=args.trash,
+            pack_threshold=args.pack_threshold,
+            pack_size=args.pack_size,
+            files_from=args.files_from,
+            null_separated=args.null,
+            max_connections=args.max_connections,
+            profile_path=profile_path,
+            profile_stacks_path=profile_stacks_path,
+            order=args.order,
+            priorities=args.priority,
+            fair=args.fair,
+            excludes=excludes,
+            includes=args.include,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            newer_than=args.newer_than,
+            older_than=args.older_than,
+            bandwidth_limit=args.bwlimit,
+            bandwidth_schedule=args.bwlimit_window,
+            bandwidth_control_file=Utils.expand_path(args.bwlimit_file) if args.bwlimit_file else None,
+            manifest_path=Utils.expand_path(args.manifest) if args.manifest else None,
+            manifest_format=args.manifest_format
         )
         cmd.execute()
         if cmd.errors:
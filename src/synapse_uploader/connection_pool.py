@@ -0,0 +1,106 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ConnectionPool:
+    """HTTP connection pool configuration for the Synapse client and the upload threads.
+
+    Connections are kept alive and reused. Each host gets up to max_size connections per session,
+    this should be at least the number of threads making requests at the same time so connections
+    are not discarded and re-opened.
+    """
+    # Maximum number of hosts to keep connections open to per session (Synapse repo, file, auth and storage).
+    DEFAULT_MAX_HOSTS = 10
+
+    def __init__(self, max_size, max_hosts=DEFAULT_MAX_HOSTS):
+        self.max_size = max_size
+        self.max_hosts = max_hosts
+        self._adapters = []
+        self._lock = threading.Lock()
+
+    def mount(self, session=None):
+        """Mounts a pooled adapter on a session.
+
+        Args:
+            session: The session to mount on. A new session is created if not set.
+
+        Returns:
+            The session.
+        """
+        session = session or requests.Session()
+        adapter = _PooledHTTPAdapter(pool_connections=self.max_hosts, pool_maxsize=self.max_size)
+        with self._lock:
+            self._adapters.append(adapter)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_stats(self):
+        """Gets the connection stats for all the mounted sessions.
+
+        Returns:
+            Dict with the number of requests made, connections opened, and requests that reused a connection.
+        """
+        request_count = 0
+        connection_count = 0
+
+        with self._lock:
+            adapters = list(self._adapters)
+
+        for adapter in adapters:
+            adapter_requests, adapter_connections = adapter.get_stats()
+            request_count += adapter_requests
+            connection_count += adapter_connections
+
+        return {
+            'requests': request_count,
+            'connections': connection_count,
+            'reused': max(request_count - connection_count, 0)
+        }
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps the request and connection counts of its host pools."""
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self._closed_requests = 0
+        self._closed_connections = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        # Keep the counts of host pools that get closed.
+        pools = self.poolmanager.pools
+        dispose_func = pools.dispose_func
+
+        def dispose_pool(pool):
+            with self._lock:
+                self._closed_requests += pool.num_requests
+                self._closed_connections += pool.num_connections
+            if dispose_func:
+                dispose_func(pool)
+
+        pools.dispose_func = dispose_pool
+
+    def get_stats(self):
+        """Gets the number of requests and opened connections.
+
+        Returns:
+            Tuple of the request count and the connection count.
+        """
+        with self._lock:
+            request_count = self._closed_requests
+            connection_count = self._closed_connections
+
+        pools = self.poolmanager.pools
+        with pools.lock:
+            open_pools = list(pools._container.values())
+
+        for pool in open_pools:
+            request_count += pool.num_requests
+            connection_count += pool.num_connections
+
+        return request_count, connection_count
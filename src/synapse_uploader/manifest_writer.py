@@ -0,0 +1,112 @@
+import csv
+import json
+import queue
+import logging
+import threading
+
+
+class ManifestWriter:
+    """Writes a record for each uploaded file as the uploads finish.
+
+    Records are queued and written by a background thread so the upload threads never wait on the file, unless
+    the queue is full. The manifest is written as JSON lines or CSV, one record per line with the same fields.
+    """
+    FORMAT_JSONL = 'jsonl'
+    FORMAT_CSV = 'csv'
+    FORMATS = [FORMAT_JSONL, FORMAT_CSV]
+
+    FIELDS = ['local_path', 'size', 'md5', 'synapse_id', 'version', 'parent_id', 'status', 'archive', 'started',
+              'seconds', 'error']
+
+    STATUS_UPLOADED = 'uploaded'
+    STATUS_CURRENT = 'current'
+    STATUS_DEDUPLICATED = 'deduplicated'
+    STATUS_MOVED = 'moved'
+    STATUS_PACKED = 'packed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_TRASHED = 'trashed'
+    STATUS_FAILED = 'failed'
+
+    DEFAULT_QUEUE_SIZE = 10000
+
+    # The maximum number of records written between flushes.
+    BATCH_SIZE = 1000
+
+    def __init__(self, path, format=None, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            path: The path of the manifest file.
+            format: One of FORMATS. Defaults to CSV for .csv files and JSON lines otherwise.
+            queue_size: The maximum number of records waiting to be written.
+        """
+        self.path = path
+        self.format = format or (self.FORMAT_CSV if path.lower().endswith('.csv') else self.FORMAT_JSONL)
+        if self.format not in self.FORMATS:
+            raise ValueError('Invalid manifest format: {0}'.format(self.format))
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._fd = None
+        self._csv_writer = None
+        self.count = 0
+        # Set when the manifest cannot be written, the remaining records are dropped.
+        self.failed = False
+        self.error = None
+
+    def open(self):
+        """Opens the manifest file and starts the writer thread."""
+        self._fd = open(self.path, mode='w', newline='', encoding='utf-8')
+        if self.format == self.FORMAT_CSV:
+            self._csv_writer = csv.DictWriter(self._fd, fieldnames=self.FIELDS, extrasaction='ignore')
+            self._csv_writer.writeheader()
+        self._thread = threading.Thread(target=self._run, name='ManifestWriter', daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """Queues a record to be written. Fields missing from the record are written as empty values."""
+        self._queue.put(record)
+
+    def close(self):
+        """Writes the queued records and closes the manifest file."""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._fd:
+            self._fd.close()
+            self._fd = None
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            # Write everything that is waiting before flushing.
+            while records[-1] is not None and len(records) < self.BATCH_SIZE:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            is_closed = records[-1] is None
+            if is_closed:
+                records.pop()
+
+            if records and not self.failed:
+                try:
+                    self._write_records(records)
+                except Exception as ex:
+                    # Keep emptying the queue so the upload threads are not blocked.
+                    self.failed = True
+                    self.error = ex
+                    logging.error('Cannot write manifest: {0} : {1}'.format(self.path, str(ex)))
+
+            if is_closed:
+                return
+
+    def _write_records(self, records):
+        for record in records:
+            if self._csv_writer:
+                self._csv_writer.writerow(record)
+            else:
+                self._fd.write(json.dumps({field: record.get(field, None) for field in self.FIELDS}))
+                self._fd.write('\n')
+        self._fd.flush()
+        self.count += len(records)
@@ -0,0 +1,173 @@
+import re
+import zlib
+
+
+class OverflowLayout:
+    """Places the files and folders of a directory in its Synapse container and overflow folders.
+
+    A Synapse container has at most max_depth children. When a directory has more files and folders, new names
+    are assigned to balanced more_NNNN overflow folders by a hash of the name so re-syncs get the same overflow
+    folder. Overflow folders are filled to about half of max_depth and nested when there are more overflow folders
+    than max_depth. The number of overflow folders only grows, new folders are added for the new names and the
+    existing names are not moved.
+
+    Names already in Synapse keep their place so they are not uploaded again: names directly in the container,
+    in a more_NNNN overflow folder, or in the chain of nested "more" folders made by earlier versions. New names
+    in a container with a "more" chain are added to the chain.
+    """
+    FOLDER_NAME = 'more_{0:04d}'
+    FOLDER_PATTERN = re.compile(r'more_(\d{4,})')
+    LEGACY_FOLDER_NAME = 'more'
+
+    def __init__(self, max_depth, existing=None, overflow_folders=None):
+        """
+        Args:
+            max_depth: The maximum number of children in a Synapse container.
+            existing: Dict of the overflow folder path (tuple of folder names) of each file and folder already in
+                Synapse. The path is empty for the names directly in the container.
+            overflow_folders: The paths of the overflow folders already in Synapse, including the parent paths.
+        """
+        self.max_depth = max_depth
+        self._existing = dict(existing or {})
+        self._overflow_folders = set(overflow_folders or [])
+        # Overflow folders can only be found from the paths of the names in them when they are not given.
+        if overflow_folders is None:
+            for path in self._existing.values():
+                self._overflow_folders.update(path[:level] for level in range(1, len(path) + 1))
+
+    @classmethod
+    def is_folder_name(cls, name):
+        """Gets if a folder name is the name of an overflow folder."""
+        return name == cls.LEGACY_FOLDER_NAME or cls.FOLDER_PATTERN.fullmatch(name) is not None
+
+    def place(self, names):
+        """Gets the overflow folder path of each name.
+
+        The placed names are added to the layout, names in a directory can be placed in batches.
+
+        Args:
+            names: The names of the files and directories in a directory.
+
+        Returns:
+            List of the overflow folder path (tuple of folder names) for each name. The paths are empty for the
+            names in the container itself. The path is None for the names that cannot be placed without putting
+            more than max_depth children in the container.
+        """
+        if (self.LEGACY_FOLDER_NAME,) in self._overflow_folders:
+            bucket_paths = self._place_legacy(names)
+        else:
+            direct_names = set(name for name, path in self._existing.items() if not path)
+            top_folders = set(path[0] for path in self._overflow_folders)
+            numbered_folders = set(name for name in top_folders if self._get_index((name,)) is not None)
+            new_names = set(name for name in names if name not in direct_names)
+
+            if not numbered_folders and len(direct_names) + len(new_names) + len(top_folders) <= self.max_depth:
+                bucket_paths = [()] * len(names)
+            else:
+                bucket_paths = self._place_numbered(names, direct_names, self.max_depth - len(direct_names) -
+                                                    len(top_folders - numbered_folders))
+
+        for name, bucket_path in zip(names, bucket_paths):
+            if bucket_path is not None:
+                self._existing[name] = bucket_path
+                self._overflow_folders.update(bucket_path[:level] for level in range(1, len(bucket_path) + 1))
+
+        return bucket_paths
+
+    def _place_numbered(self, names, direct_names, capacity):
+        """Places the names that are not directly in the container in more_NNNN overflow folders.
+
+        Args:
+            names: The names of the files and directories in a directory.
+            direct_names: The names directly in the container, they keep their place.
+            capacity: The number of overflow folders the container has room for.
+        """
+        # Index of the overflow folder each existing name is in.
+        existing_indexes = {}
+        for name, bucket_path in self._existing.items():
+            bucket = self._get_index(bucket_path) if bucket_path else None
+            if bucket is not None:
+                existing_indexes[name] = (bucket, len(bucket_path))
+
+        fill = max(self.max_depth // 2, 1)
+        total = len(set(name for name in names if name not in direct_names).union(existing_indexes))
+        max_existing_bucket = max([bucket for bucket, _ in existing_indexes.values()], default=-1)
+        bucket_count = 1
+        while bucket_count * fill < total or bucket_count <= max_existing_bucket:
+            bucket_count *= 2
+
+        levels = max([bucket_levels for _, bucket_levels in existing_indexes.values()], default=1)
+        while self.max_depth ** levels < bucket_count or \
+                -(-bucket_count // self.max_depth ** (levels - 1)) > max(capacity, 1):
+            levels += 1
+
+        # Existing names in less nested overflow folders cannot be kept.
+        existing_indexes = {name: bucket for name, (bucket, bucket_levels) in existing_indexes.items()
+                            if bucket_levels == levels}
+
+        bucket_sizes = [0] * bucket_count
+        for bucket in existing_indexes.values():
+            bucket_sizes[bucket] += 1
+
+        bucket_paths = []
+        for name in names:
+            if name in direct_names:
+                bucket_paths.append(())
+                continue
+            bucket = existing_indexes.get(name, None)
+            if bucket is None:
+                if capacity < 1:
+                    bucket_paths.append(None)
+                    continue
+                bucket = zlib.crc32(name.encode('utf-8', 'surrogateescape')) % bucket_count
+                while bucket_sizes[bucket] >= self.max_depth:
+                    bucket = (bucket + 1) % bucket_count
+                bucket_sizes[bucket] += 1
+
+            bucket_path = []
+            for _ in range(levels):
+                bucket, index = divmod(bucket, self.max_depth)
+                bucket_path.insert(0, self.FOLDER_NAME.format(index + 1))
+            bucket_paths.append(tuple(bucket_path))
+
+        return bucket_paths
+
+    def _place_legacy(self, names):
+        """Places the new names in the first level of the "more" chain with room, or in a new level at its end.
+
+        Each level holds max_depth - 1 names and the "more" folder of the next level.
+        """
+        level_sizes = {}
+        for path in self._existing.values():
+            if self._is_legacy_path(path):
+                level_sizes[len(path)] = level_sizes.get(len(path), 0) + 1
+        # Other overflow folders take a place in their level.
+        for path in self._overflow_folders:
+            if not self._is_legacy_path(path) and self._is_legacy_path(path[:-1]):
+                level_sizes[len(path) - 1] = level_sizes.get(len(path) - 1, 0) + 1
+
+        bucket_paths = []
+        for name in names:
+            bucket_path = self._existing.get(name, None)
+            if bucket_path is None:
+                level = 0
+                while level_sizes.get(level, 0) >= self.max_depth - 1:
+                    level += 1
+                level_sizes[level] = level_sizes.get(level, 0) + 1
+                bucket_path = (self.LEGACY_FOLDER_NAME,) * level
+            bucket_paths.append(bucket_path)
+
+        return bucket_paths
+
+    def _is_legacy_path(self, path):
+        return all(folder_name == self.LEGACY_FOLDER_NAME for folder_name in path)
+
+    def _get_index(self, bucket_path):
+        """Gets the index of an overflow folder path, None if it is not a valid path for max_depth."""
+        bucket = 0
+        for folder_name in bucket_path:
+            match = self.FOLDER_PATTERN.fullmatch(folder_name)
+            if not match or not 1 <= int(match.group(1)) <= self.max_depth:
+                return None
+            bucket = bucket * self.max_depth + int(match.group(1)) - 1
+        return bucket
@@ -0,0 +1,99 @@
+import os
+import bisect
+import hashlib
+import tarfile
+from .utils import Utils
+
+
+class PackedArchive:
+    """A tar archive of local files that is generated on demand instead of being written to disk.
+
+    Any byte range of the archive can be read so it can be uploaded in parts. The first member of the
+    archive is a manifest listing the packed files. The local files must not change while the archive is
+    being uploaded.
+    """
+    MANIFEST_NAME = 'MANIFEST.tsv'
+
+    def __init__(self, path, local_files):
+        """
+        Args:
+            path: The path of the archive as if it were in the local directory, it is not written to disk.
+            local_files: List of (local_file, os.stat_result) tuples to pack.
+        """
+        self.path = path
+        self.name = os.path.basename(path)
+        self.local_files = local_files
+        self._md5 = None
+
+        # Ordered list of (offset, length, source) where source is bytes or a local file path.
+        self._segments = []
+        self.size = 0
+
+        manifest = self._build_manifest()
+        self._add_member(self.MANIFEST_NAME, len(manifest), 0, 0o644, manifest)
+        for local_file, stat in local_files:
+            self._add_member(os.path.basename(local_file), stat.st_size, int(stat.st_mtime), stat.st_mode & 0o777,
+                             local_file)
+
+        # End of archive: two zero blocks padded to the tar record size.
+        end_size = tarfile.BLOCKSIZE * 2
+        remainder = (self.size + end_size) % tarfile.RECORDSIZE
+        if remainder > 0:
+            end_size += tarfile.RECORDSIZE - remainder
+        self._add_segment(bytes(end_size))
+
+        self._offsets = [offset for offset, _, _ in self._segments]
+
+    def _build_manifest(self):
+        lines = ['name\tsize\tmtime']
+        for local_file, stat in self.local_files:
+            lines.append('{0}\t{1}\t{2}'.format(os.path.basename(local_file), stat.st_size, int(stat.st_mtime)))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _add_member(self, name, size, mtime, mode, source):
+        tar_info = tarfile.TarInfo(name=name)
+        tar_info.size = size
+        tar_info.mtime = mtime
+        tar_info.mode = mode
+        self._add_segment(tar_info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+
+        if size > 0:
+            self._segments.append((self.size, size, source))
+            self.size += size
+            remainder = size % tarfile.BLOCKSIZE
+            if remainder > 0:
+                self._add_segment(bytes(tarfile.BLOCKSIZE - remainder))
+
+    def _add_segment(self, data):
+        self._segments.append((self.size, len(data), data))
+        self.size += len(data)
+
+    def read(self, offset, length):
+        """Reads a byte range of the archive."""
+        chunks = []
+        end = min(offset + length, self.size)
+        index = bisect.bisect_right(self._offsets, offset) - 1
+
+        while offset < end:
+            segment_offset, segment_length, source = self._segments[index]
+            start = offset - segment_offset
+            count = min(segment_length - start, end - offset)
+            if isinstance(source, bytes):
+                chunks.append(source[start:start + count])
+            else:
+                chunk = Utils.read_range(source, start, count)
+                # Keep the archive layout if the file was truncated.
+                chunks.append(chunk.ljust(count, b'\0'))
+            offset += count
+            index += 1
+
+        return b''.join(chunks)
+
+    def get_md5(self):
+        """Gets the MD5 of the archive. The MD5 is only calculated once."""
+        if self._md5 is None:
+            md5 = hashlib.md5()
+            for offset in range(0, self.size, Utils.CHUNK_SIZE):
+                md5.update(self.read(offset, Utils.CHUNK_SIZE))
+            self._md5 = md5.hexdigest()
+        return self._md5
@@ -0,0 +1,177 @@
+import re
+import posixpath
+
+
+class PathFilter:
+    """Filters the local files and directories to upload.
+
+    Exclude patterns use the .gitignore syntax:
+        - Blank lines and lines starting with "#" are ignored.
+        - "*" matches anything except "/", "?" matches one character except "/", "[...]" matches a range.
+        - "**" matches any number of directories.
+        - A pattern ending with "/" only matches directories.
+        - A pattern containing a "/" other than at the end is matched against the path relative to the local
+          path, other patterns are matched against the name at any depth.
+        - A pattern starting with "!" re-includes what an earlier pattern excluded. The last matching pattern wins.
+
+    Excluded directories are not descended into. When there are include patterns, only files matching one of
+    them, or in a directory matching one of them (e.g. "results/"), are uploaded. Files can also be filtered by
+    size and modification time.
+
+    The patterns are compiled once, paths are relative to the local path and use "/" as the separator.
+    """
+
+    def __init__(self, excludes=None, includes=None, min_size=None, max_size=None, newer_than=None,
+                 older_than=None):
+        """
+        Args:
+            excludes: List of .gitignore style patterns to exclude.
+            includes: List of .gitignore style patterns, only files matching one of them are uploaded.
+            min_size: Only upload files of at least this size in bytes.
+            max_size: Only upload files of at most this size in bytes.
+            newer_than: Only upload files modified at or after this timestamp.
+            older_than: Only upload files modified before this timestamp.
+        """
+        self._excludes = [self._compile(p) for p in (excludes or []) if self._is_pattern(p)]
+        self._includes = [self._compile(p) for p in (includes or []) if self._is_pattern(p)]
+        self._min_size = min_size
+        self._max_size = max_size
+        self._newer_than = newer_than
+        self._older_than = older_than
+        self._needs_stat = any(v is not None for v in [min_size, max_size, newer_than, older_than])
+
+    @property
+    def is_empty(self):
+        """Gets if the filter does not exclude anything."""
+        return not (self._excludes or self._includes or self._needs_stat)
+
+    @property
+    def needs_stat(self):
+        """Gets if files need to be stat'd to be filtered."""
+        return self._needs_stat
+
+    def is_dir_excluded(self, relative_path):
+        """Gets if a directory is excluded."""
+        return self._is_excluded(self._excludes, relative_path, True)
+
+    def is_file_excluded(self, relative_path, stat=None):
+        """Gets if a file is excluded.
+
+        Args:
+            relative_path: The path of the file relative to the local path.
+            stat: The os.stat_result of the file. The size and modification time filters are skipped when not set.
+        """
+        if self._is_excluded(self._excludes, relative_path, False):
+            return True
+
+        if self._includes and not self._is_included(relative_path):
+            return True
+
+        if self._needs_stat and stat is not None:
+            if self._min_size is not None and stat.st_size < self._min_size:
+                return True
+            if self._max_size is not None and stat.st_size > self._max_size:
+                return True
+            if self._newer_than is not None and stat.st_mtime < self._newer_than:
+                return True
+            if self._older_than is not None and stat.st_mtime >= self._older_than:
+                return True
+
+        return False
+
+    def is_path_excluded(self, relative_path, stat=None):
+        """Gets if a file or any of its parent directories are excluded."""
+        parent_dir = posixpath.dirname(relative_path)
+        while parent_dir:
+            if self.is_dir_excluded(parent_dir):
+                return True
+            parent_dir = posixpath.dirname(parent_dir)
+        return self.is_file_excluded(relative_path, stat)
+
+    @staticmethod
+    def read_patterns(path):
+        """Reads the patterns from a .gitignore style file."""
+        with open(path, mode='r') as fd:
+            return [line.rstrip('\r\n') for line in fd]
+
+    @staticmethod
+    def _is_pattern(pattern):
+        return pattern.strip() != '' and not pattern.startswith('#')
+
+    def _is_included(self, relative_path):
+        # The file or its nearest parent directory matching an include pattern decides.
+        matched = self._match(self._includes, relative_path, False)
+        parent_dir = posixpath.dirname(relative_path)
+        while matched is None and parent_dir:
+            matched = self._match(self._includes, parent_dir, True)
+            parent_dir = posixpath.dirname(parent_dir)
+        return bool(matched)
+
+    @staticmethod
+    def _is_excluded(rules, relative_path, is_dir):
+        return bool(PathFilter._match(rules, relative_path, is_dir))
+
+    @staticmethod
+    def _match(rules, relative_path, is_dir):
+        """Gets if the last rule matching a path is not negated, None when no rule matches."""
+        name = posixpath.basename(relative_path)
+        # The last matching rule wins.
+        for regex, negate, dir_only, anchored in reversed(rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path if anchored else name):
+                return not negate
+        return None
+
+    @classmethod
+    def _compile(cls, pattern):
+        """Compiles a .gitignore style pattern.
+
+        Returns:
+            Tuple of the regex, whether the pattern is negated, whether it only matches directories,
+            and whether it is matched against the relative path instead of the name.
+        """
+        pattern = pattern.strip()
+        negate = pattern.startswith('!')
+        if negate:
+            pattern = pattern[1:]
+
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        return re.compile(cls._translate(pattern) + r'\Z'), negate, dir_only, anchored
+
+    @staticmethod
+    def _translate(pattern):
+        regex = []
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith('**/', index) and (index == 0 or pattern[index - 1] == '/'):
+                regex.append('(?:.*/)?')
+                index += 3
+                continue
+            elif pattern.startswith('**', index):
+                regex.append('.*')
+                index += 2
+                continue
+            elif char == '*':
+                regex.append('[^/]*')
+            elif char == '?':
+                regex.append('[^/]')
+            elif char == '[':
+                end = pattern.find(']', index + 2)
+                if end < 0:
+                    regex.append(re.escape(char))
+                else:
+                    char_range = pattern[index + 1:end]
+                    if char_range.startswith('!'):
+                        char_range = '^' + char_range[1:]
+                    regex.append('[{0}]'.format(char_range.replace('\\', '\\\\')))
+                    index = end
+            else:
+                regex.append(re.escape(char))
+            index += 1
+        return ''.join(regex)
@@ -0,0 +1,158 @@
+import sys
+import time
+import threading
+import contextlib
+import collections
+
+
+class Profiler:
+    """Records the time spent in each stage of an upload run.
+
+    For each stage this keeps:
+        calls: The number of times the stage ran.
+        wall: The time at least one thread was running the stage.
+        thread: The time summed over all threads running the stage.
+        critical: The time the stage was the only stage running, this time directly added to the run time.
+
+    Stages should not be nested.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {'calls': 0, 'wall': 0.0, 'thread': 0.0, 'critical': 0.0})
+        self._active = collections.Counter()
+        self._active_since = {}
+        self._last_event = self.start_time
+        self._sampler = None
+
+    def stage(self, name):
+        """Context manager that records the time spent in a stage."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        start = self._event(name, 1)
+        try:
+            yield
+        finally:
+            end = self._event(name, -1)
+            with self._lock:
+                stats = self._stats[name]
+                stats['calls'] += 1
+                stats['thread'] += end - start
+
+    def _event(self, name, change):
+        with self._lock:
+            now = time.perf_counter()
+
+            if len(self._active) == 1:
+                active_name = next(iter(self._active))
+                self._stats[active_name]['critical'] += now - self._last_event
+            self._last_event = now
+
+            if change > 0:
+                if self._active[name] == 0:
+                    self._active_since[name] = now
+                self._active[name] += 1
+            else:
+                self._active[name] -= 1
+                if self._active[name] == 0:
+                    del self._active[name]
+                    self._stats[name]['wall'] += now - self._active_since.pop(name)
+
+            return now
+
+    def start_sampling(self, interval=0.01):
+        """Starts sampling the stacks of the registered threads."""
+        if self.enabled and not self._sampler:
+            self._sampler = _StackSampler(interval)
+            self._sampler.add_thread()
+            self._sampler.start()
+
+    def add_thread(self):
+        """Registers the current thread for stack sampling."""
+        if self._sampler:
+            self._sampler.add_thread()
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+        if self._sampler:
+            self._sampler.stop()
+
+    def get_report(self):
+        """Gets the stage breakdown as a text table."""
+        end_time = self.end_time or time.perf_counter()
+        row_format = '{0:<16}{1:>10}{2:>14}{3:>14}{4:>14}'
+        lines = [row_format.format('Stage', 'Calls', 'Wall (s)', 'Thread (s)', 'Critical (s)')]
+
+        with self._lock:
+            stages = sorted(self._stats.items(), key=lambda s: s[1]['wall'], reverse=True)
+            for name, stats in stages:
+                lines.append(row_format.format(name,
+                                               stats['calls'],
+                                               '{0:.3f}'.format(stats['wall']),
+                                               '{0:.3f}'.format(stats['thread']),
+                                               '{0:.3f}'.format(stats['critical'])))
+
+        lines.append('Run time: {0:.3f}s'.format(end_time - self.start_time))
+        return '\n'.join(lines)
+
+    def write_report(self, path):
+        with open(path, mode='w') as fd:
+            fd.write(self.get_report())
+            fd.write('\n')
+
+    def write_stacks(self, path):
+        """Writes the sampled stacks in the collapsed format used by flame graph tools."""
+        if not self._sampler:
+            return
+        with open(path, mode='w') as fd:
+            for stack, count in self._sampler.get_stacks().most_common():
+                fd.write('{0} {1}\n'.format(stack, count))
+
+
+class _StackSampler(threading.Thread):
+    """Samples the stacks of a set of threads at an interval."""
+
+    def __init__(self, interval):
+        super().__init__(name='StackSampler', daemon=True)
+        self._interval = interval
+        self._thread_ids = set()
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def add_thread(self):
+        with self._lock:
+            self._thread_ids.add(threading.get_ident())
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in self._thread_ids:
+                    frame = frames.get(thread_id, None)
+                    if frame:
+                        self._stacks[self._collapse(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def get_stacks(self):
+        with self._lock:
+            return collections.Counter(self._stacks)
+
+    @staticmethod
+    def _collapse(frame):
+        stack = []
+        while frame:
+            code = frame.f_code
+            stack.append('{0}:{1}'.format(code.co_filename, code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
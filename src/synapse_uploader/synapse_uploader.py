@@ -1,14 +1,32 @@
 import os
+import re
 import time
 import random
 import concurrent.futures
 import threading
 import logging
 import functools
+import hashlib
+import mimetypes
+import json
+import sys
 from datetime import datetime
 import synapseclient as syn
+from synapseclient.core.constants import concrete_types
+from synapseclient.core.upload import multipart_upload
 from .utils import Utils
+from .packed_archive import PackedArchive
+from .connection_pool import ConnectionPool
+from .children_cache import ChildrenCache
+from .overflow_layout import OverflowLayout
+from .upload_scheduler import UploadScheduler
+from .path_filter import PathFilter
+from .bandwidth_limiter import BandwidthLimiter
+from .upload_body import UploadBody
+from .manifest_writer import ManifestWriter
+from .profiler import Profiler
 from synapsis import Synapsis
+from synapsis.core.exceptions import SynapsisError
 
 
 class SynapseUploader:
@@ -18,13 +36,45 @@ class SynapseUploader:
     # Minimum depth for Projects/Folders in Synapse.
     MIN_SYNAPSE_DEPTH = 2
 
+    # Default target size of the archives small files are packed into.
+    DEFAULT_PACK_SIZE = Utils.GB
+
+    # Name of the archives small files are packed into.
+    PACKED_FILES_NAME = 'packed-files-{0:04d}.tar'
+
+    # Maximum number of listed files joined to a Synapse container at a time.
+    FILES_FROM_BATCH_SIZE = 1000
+
     def __init__(self,
                  synapse_entity_id,
                  local_path,
                  remote_path=None,
                  max_depth=MAX_SYNAPSE_DEPTH,
                  max_threads=None,
-                 force_upload=False):
+                 force_upload=False,
+                 mirror=False,
+                 trash=False,
+                 pack_threshold=None,
+                 pack_size=DEFAULT_PACK_SIZE,
+                 files_from=None,
+                 null_separated=False,
+                 max_connections=None,
+                 profile_path=None,
+                 profile_stacks_path=None,
+                 order=UploadScheduler.ORDER_NAME,
+                 priorities=None,
+                 fair=False,
+                 excludes=None,
+                 includes=None,
+                 min_size=None,
+                 max_size=None,
+                 newer_than=None,
+                 older_than=None,
+                 bandwidth_limit=None,
+                 bandwidth_schedule=None,
+                 bandwidth_control_file=None,
+                 manifest_path=None,
+                 manifest_format=None):
 
         self._synapse_entity_id = synapse_entity_id
         self._local_path = Utils.expand_path(local_path)
@@ -32,6 +82,32 @@ class SynapseUploader:
         self._max_depth = max_depth
         self._max_threads = max_threads
         self._force_upload = force_upload
+        self._mirror = mirror
+        self._trash = trash
+        self._pack_threshold = pack_threshold
+        self._pack_size = pack_size
+        self._files_from = files_from
+        self._null_separated = null_separated
+        self._max_connections = max_connections
+        self._connection_pool = None
+        self._profile_path = profile_path
+        self._profile_stacks_path = profile_stacks_path
+        self._profiler = Profiler(enabled=bool(profile_path or profile_stacks_path))
+        self._order = order
+        self._priorities = priorities or []
+        self._fair = fair
+        self._scheduler = None
+        self._excludes = excludes or []
+        self._includes = includes or []
+        self._min_size = min_size
+        self._max_size = max_size
+        self._newer_than = newer_than
+        self._older_than = older_than
+        self._path_filter = PathFilter()
+        self._bandwidth_limiter = BandwidthLimiter(rate=bandwidth_limit,
+                                                   schedule=bandwidth_schedule,
+                                                   control_file=bandwidth_control_file)
+        self._manifest = ManifestWriter(manifest_path, format=manifest_format) if manifest_path else None
 
         self.start_time = None
         self.end_time = None
@@ -40,6 +116,25 @@ class SynapseUploader:
         self._synapse_parents = {}
         self.errors = []
 
+        # Mirror state: the Synapse containers being mirrored and the folder names used in each,
+        # the new local files, and the remote files/folders that no longer exist locally.
+        self._mirror_containers = {}
+        self._mirror_new_files = []
+        self._mirror_orphan_files = []
+        self._mirror_orphan_folders = []
+        self._mirror_index = {}
+        self._mirror_index_sizes = set()
+        self._mirror_claimed_ids = set()
+        # The local directory (relative to the local path) of each mirrored container and its excluded names.
+        self._mirror_excluded = {}
+
+        # The first File stored for the content uploaded during this run keyed by storage location, size and MD5.
+        self._content_file_handles = {}
+        # Copies of those file handles with other file names keyed by the content key and file name.
+        self._renamed_file_handles = {}
+
+        self._synapse_children = ChildrenCache(self._list_synapse_children)
+
         if remote_path:
             self._remote_path = remote_path.replace(' ', '').lstrip(os.sep).rstrip(os.sep)
             if len(self._remote_path) == 0:
@@ -56,9 +151,70 @@ class SynapseUploader:
             self._show_error('Maximum depth must be greater than or equal to {0}.'.format(self.MIN_SYNAPSE_DEPTH))
             return self
 
+        if self._pack_threshold and self._pack_size < self._pack_threshold:
+            self._show_error('Pack size must be greater than or equal to the pack threshold.')
+            return self
+
+        if self._trash and not self._mirror:
+            self._show_error('Trash can only be used when mirroring.')
+            return self
+
+        if self._files_from and self._mirror:
+            self._show_error('Cannot mirror a list of files.')
+            return self
+
+        if self._files_from and self._files_from != '-' and not os.path.isfile(Utils.expand_path(self._files_from)):
+            self._show_error('Files from not found: {0}'.format(self._files_from))
+            return self
+
+        if self._order not in UploadScheduler.ORDERS:
+            self._show_error('Order must be one of: {0}.'.format(', '.join(UploadScheduler.ORDERS)))
+            return self
+
+        if self._min_size is not None and self._max_size is not None and self._min_size > self._max_size:
+            self._show_error('Minimum size must be less than or equal to the maximum size.')
+            return self
+
+        try:
+            self._path_filter = PathFilter(excludes=self._excludes,
+                                           includes=self._includes,
+                                           min_size=self._min_size,
+                                           max_size=self._max_size,
+                                           newer_than=self._newer_than,
+                                           older_than=self._older_than)
+        except re.error as ex:
+            self._show_error('Invalid include or exclude pattern: {0}'.format(str(ex)))
+            return self
+
         if self._force_upload:
             logging.info('Forcing upload. Entity versions will be incremented.')
 
+        if self._mirror:
+            logging.info('Mirroring. Remote files moved or renamed locally will be moved in Synapse.')
+            if self._trash:
+                logging.info('Remote files and folders that do not exist locally will be moved to the trash.')
+
+        self._scheduler = UploadScheduler(self._local_path,
+                                          order=self._order,
+                                          priorities=self._priorities,
+                                          fair=self._fair)
+        if not self._scheduler.is_fifo:
+            logging.info('Upload order: {0}{1}{2}'.format(
+                self._order,
+                ', priorities: {0}'.format(' '.join(self._priorities)) if self._priorities else '',
+                ', fair across top-level directories' if self._fair else ''))
+
+        if self._bandwidth_limiter.enabled:
+            logging.info('Bandwidth limit: {0}'.format(
+                BandwidthLimiter.format_rate(self._bandwidth_limiter.get_rate())))
+
+        # Size the HTTP connection pool for the upload threads plus the folder threads and the main thread.
+        self._connection_pool = ConnectionPool(self._max_connections or (self._get_thread_count() * 2 + 1))
+        self._connection_pool.mount(Synapsis.Synapse._requests_session)
+
+        if self._profile_stacks_path:
+            self._profiler.start_sampling()
+
         remote_entity = Synapsis.get(self._synapse_entity_id, downloadFile=False)
         remote_entity_type = Synapsis.ConcreteTypes.get(remote_entity)
         if not (remote_entity_type.is_project or remote_entity_type.is_folder or remote_entity_type.is_file):
@@ -83,14 +239,19 @@ class SynapseUploader:
             self._show_error('Local entity must be a file when remote entity is a file: {0}'.format(self._local_path))
             return self
 
+        if self._files_from and local_entity_is_file:
+            self._show_error('Local entity must be a directory when uploading a list of files: {0}'.format(
+                self._local_path))
+            return self
+
+        if remote_entity_type.is_file and self._mirror:
+            self._show_error('Cannot mirror when remote entity is a file: {0}'.format(self._local_path))
+            return self
+
         if remote_entity_type.is_file and self._remote_path:
             self._show_error('Cannot specify a remote path when remote entity is a file: {0}'.format(self._local_path))
             return self
 
-        logging.info(
-            'Uploading to {0}: {1} ({2})'.format(remote_entity_type.name, remote_entity.name, remote_entity.id))
-        logging.info('Uploading {0}: {1}'.format(local_type, self._local_path))
-
         if remote_entity_type.is_file:
             remote_file_name = remote_entity['_file_handle']['fileName']
             local_file_name = os.path.basename(self._local_path)
@@ -99,59 +260,465 @@ class SynapseUploader:
                                                                                                    remote_file_name))
                 return self
 
-            remote_parent = Synapsis.get(remote_entity.get('parentId'))
-            self._set_synapse_parent(remote_parent)
-            self._upload_file_to_synapse(self._local_path, remote_parent)
-        else:
-            if self._remote_path:
-                logging.info('Uploading to: {0}'.format(self._remote_path))
-
-            remote_parent = remote_entity
+        logging.info(
+            'Uploading to {0}: {1} ({2})'.format(remote_entity_type.name, remote_entity.name, remote_entity.id))
+        logging.info('Uploading {0}: {1}'.format(local_type, self._local_path))
 
-            # Create the remote_path if specified.
-            if self._remote_path:
-                full_path = ''
-                for folder in filter(None, self._remote_path.split(os.sep)):
-                    full_path = os.path.join(full_path, folder)
-                    remote_parent = self._create_folder_in_synapse(full_path, remote_parent)
+        if self._manifest:
+            self._manifest.open()
+            logging.info('Writing manifest to: {0}'.format(self._manifest.path))
+
+        try:
+            if remote_entity_type.is_file:
+                remote_parent = Synapsis.get(remote_entity.get('parentId'))
+                self._set_synapse_parent(remote_parent)
+                with self._new_executor() as executor:
+                    local_files = [(self._local_path, os.path.getsize(self._local_path))]
+                    self._submit_files(executor, local_files, remote_parent)
+            else:
+                if self._remote_path:
+                    logging.info('Uploading to: {0}'.format(self._remote_path))
+
+                remote_parent = remote_entity
+
+                # Create the remote_path if specified.
+                if self._remote_path:
+                    full_path = ''
+                    for folder in filter(None, self._remote_path.split(os.sep)):
+                        full_path = os.path.join(full_path, folder)
+                        remote_parent = self._create_folder_in_synapse(full_path, remote_parent)
+
+                with self._new_executor() as executor:
+                    if self._files_from:
+                        logging.info('Uploading Files From: {0}'.format(self._files_from))
+                        self._upload_files_from(executor, remote_parent)
+                    else:
+                        self._upload_folder(executor, self._local_path, remote_parent)
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_threads) as executor:
-                self._upload_folder(executor, self._local_path, remote_parent)
+                if self._mirror:
+                    self._mirror_folder()
+        finally:
+            if self._manifest:
+                self._manifest.close()
+                if self._manifest.failed:
+                    self._show_error('Cannot write manifest: {0} : {1}'.format(self._manifest.path,
+                                                                             str(self._manifest.error)))
 
         self.end_time = datetime.now()
         logging.info('')
+        connection_stats = self._connection_pool.get_stats()
+        logging.info('Connections: {0} requests, {1} opened, {2} reused'.format(connection_stats['requests'],
+                                                                            connection_stats['connections'],
+                                                                            connection_stats['reused']))
         logging.info('Run time: {0}'.format(self.end_time - self.start_time))
+
+        if self._profiler.enabled:
+            self._write_profile()
+
         return self
 
     def _upload_folder(self, executor, local_path, synapse_parent):
         if not synapse_parent:
             self._show_error('Parent not found, cannot execute folder: {0}'.format(local_path))
+            self._write_folder_failed(local_path, 'Parent not found')
             return
 
-        parent = synapse_parent
+        overflow_layout = self._get_overflow_layout(synapse_parent, local_path)
+        if overflow_layout is None:
+            self._write_folder_failed(local_path, 'Cannot get overflow folders')
+            return
+
+        self._add_mirror_container(synapse_parent)
+
+        relative_dir = self._get_relative_dir(local_path)
+        with self._profiler.stage('scan'):
+            dirs, files, excluded_names = self._get_dirs_and_files(local_path, relative_dir)
+        local_files, archives = self._pack_files(local_path, files, synapse_parent)
 
-        dirs, files = self._get_dirs_and_files(local_path)
+        # Spread the files and directories over overflow folders when there are too many for one container.
+        local_names = [os.path.basename(local_file) for local_file, _ in local_files] + [d.name for d in dirs]
+        bucket_paths = overflow_layout.place(local_names)
+        synapse_buckets = self._create_overflow_folders(bucket_paths, synapse_parent)
 
-        child_count = 0
+        bucket_files = {bucket_path: [] for bucket_path in synapse_buckets}
+        for (local_file, local_file_size), bucket_path in zip(local_files, bucket_paths):
+            if bucket_path is None:
+                self._fail_overflow_file(local_file, local_file_size, local_path)
+                continue
+            bucket_files[bucket_path].append((local_file, local_file_size))
+
+        if self._mirror:
+            for synapse_container in synapse_buckets.values():
+                if synapse_container:
+                    self._mirror_excluded[synapse_container['id']] = (relative_dir, set(excluded_names))
 
         # Upload the files
+        for bucket_path, parent_files in bucket_files.items():
+            self._submit_files(executor, parent_files, synapse_buckets[bucket_path], archives=archives)
+
+        # Upload the directories.
+        for dir_entry, bucket_path in zip(dirs, bucket_paths[len(local_files):]):
+            if bucket_path is None:
+                self._show_error('[Folder FAILED] {0} : More than {1} files and folders in: {2}'.format(
+                    dir_entry.path, self._max_depth, local_path))
+                self._write_folder_failed(dir_entry.path, 'More than {0} files and folders'.format(self._max_depth))
+                continue
+            syn_dir = self._create_folder_in_synapse(dir_entry.path, synapse_buckets[bucket_path])
+            self._upload_folder(executor, dir_entry.path, syn_dir)
+
+    def _write_folder_failed(self, local_path, error):
+        """Writes a failed manifest record for each file under a local directory that is not uploaded."""
+        if not self._manifest:
+            return
+
+        local_dirs = [local_path]
+        while local_dirs:
+            local_dir = local_dirs.pop()
+            try:
+                dirs, files, _ = self._get_dirs_and_files(local_dir, self._get_relative_dir(local_dir))
+            except OSError as ex:
+                logging.warning('Cannot list folder: {0} : {1}'.format(local_dir, str(ex)))
+                continue
+
+            for file_entry in files:
+                stat = self._get_stat(file_entry)
+                self._write_manifest(ManifestWriter.STATUS_FAILED, file_entry.path, stat.st_size if stat else None,
+                                     error=error)
+            local_dirs.extend(dir_entry.path for dir_entry in reversed(dirs))
+
+    def _fail_overflow_file(self, local_file, local_file_size, local_path):
+        """Reports a file that does not fit in the Synapse folder of its local directory."""
+        self._show_error('[File FAILED] {0} : More than {1} files and folders in: {2}'.format(
+            local_file, self._max_depth, local_path))
+        self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size,
+                             error='More than {0} files and folders'.format(self._max_depth))
+
+    def _get_overflow_layout(self, synapse_parent, local_path):
+        """Gets the layout of the files and folders already in a Synapse container and its overflow folders.
+
+        The container's listing is shared with joining its files, only the overflow folders are listed in addition.
+        Folders with the same name as a file or directory in the local directory are not overflow folders.
+
+        Returns:
+            The OverflowLayout, or None if the overflow folders cannot be listed.
+        """
+        existing = {}
+        overflow_folders = set()
+        containers = [((), synapse_parent['id'])]
+        try:
+            while containers:
+                bucket_path, container_id = containers.pop()
+                files, folders = self._call_with_retries('Children {0}'.format(container_id),
+                                                         self._profiled('list', self._synapse_children.get_listing),
+                                                         container_id)
+                for name in files:
+                    existing[name] = bucket_path
+                for name, folder_id in folders.items():
+                    if OverflowLayout.is_folder_name(name) and not os.path.lexists(os.path.join(local_path, name)):
+                        overflow_folders.add(bucket_path + (name,))
+                        containers.append((bucket_path + (name,), folder_id))
+                    else:
+                        existing[name] = bucket_path
+        except Exception as ex:
+            self._show_error('Cannot get overflow folders in: {0} : {1}'.format(synapse_parent['id'], str(ex)))
+            return None
+
+        return OverflowLayout(self._max_depth, existing, overflow_folders)
+
+    def _create_overflow_folders(self, bucket_paths, synapse_parent, synapse_buckets=None):
+        """Creates the overflow folders in Synapse. The folders in each level are created in parallel.
+
+        Args:
+            bucket_paths: The overflow folder paths, None for the names that could not be placed.
+            synapse_parent: The Synapse container the overflow folders are in.
+            synapse_buckets: The overflow folders that are already created, they are added to.
+
+        Returns:
+            Dict of the Synapse container for each overflow folder path, including the parent paths.
+        """
+        if synapse_buckets is None:
+            synapse_buckets = {(): synapse_parent}
+        paths = set(path[:level] for path in bucket_paths if path
+                    for level in range(1, len(path) + 1)).difference(synapse_buckets)
+        if not paths:
+            return synapse_buckets
+
+        def create_folder(path):
+            return self._create_folder_in_synapse(path[-1], synapse_buckets[path[:-1]])
+
+        with self._new_executor() as folder_executor:
+            for level in range(1, max(len(path) for path in paths) + 1):
+                level_paths = sorted(path for path in paths if len(path) == level)
+                for path, synapse_folder in zip(level_paths, folder_executor.map(create_folder, level_paths)):
+                    synapse_buckets[path] = synapse_folder
+                    self._add_mirror_container(synapse_folder)
+
+        return synapse_buckets
+
+    def _upload_files_from(self, executor, synapse_parent):
+        """Uploads the files listed in files_from.
+
+        The listed paths are relative to the local path (or absolute paths within it) and are uploaded to
+        the same relative folders in Synapse. Consecutive files in the same directory are placed in the existing
+        layout of their Synapse folder, including its overflow folders, and joined to their Synapse containers
+        together. The files that do not fit in a full Synapse folder are not uploaded.
+        """
+        # Synapse folders by their local directory relative to the local path.
+        synapse_folders = {'': synapse_parent}
+        # The overflow layout and the created overflow folders of each Synapse folder, None if it cannot be listed.
+        overflow_layouts = {}
+        parent_files = []
+        parent_dir = None
+
+        if self._files_from == '-':
+            files_from = sys.stdin
+        else:
+            try:
+                files_from = open(Utils.expand_path(self._files_from), mode='r')
+            except OSError as ex:
+                self._show_error('Cannot read files from: {0} : {1}'.format(self._files_from, str(ex)))
+                return
+
+        try:
+            for path in Utils.read_paths(files_from, null_separated=self._null_separated):
+                # Listed paths are used as they are, "~" and "$VAR" are literal characters in file names.
+                local_file = os.path.abspath(os.path.join(self._local_path, path))
+                relative_path = os.path.relpath(local_file, self._local_path)
+
+                if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+                    self._show_error('File is not in the local path: {0}'.format(local_file))
+                    continue
+
+                if not os.path.isfile(local_file):
+                    self._show_error('File not found: {0}'.format(local_file))
+                    continue
+
+                if not self._path_filter.is_empty and self._path_filter.is_path_excluded(
+                        relative_path.replace(os.sep, '/'),
+                        os.stat(local_file) if self._path_filter.needs_stat else None):
+                    logging.debug('Excluded: {0}'.format(local_file))
+                    continue
+
+                relative_dir = os.path.dirname(relative_path)
+                if relative_dir != parent_dir or len(parent_files) >= self.FILES_FROM_BATCH_SIZE:
+                    if parent_files:
+                        self._submit_files_from(executor, parent_files, parent_dir, synapse_folders, overflow_layouts)
+                    parent_files = []
+                    parent_dir = relative_dir
+
+                parent_files.append((local_file, os.path.getsize(local_file)))
+
+            if parent_files:
+                self._submit_files_from(executor, parent_files, parent_dir, synapse_folders, overflow_layouts)
+        finally:
+            if files_from is not sys.stdin:
+                files_from.close()
+
+    def _submit_files_from(self, executor, local_files, relative_dir, synapse_folders, overflow_layouts):
+        """Submits listed files in a local directory to the Synapse containers they are placed in."""
+        local_names = [os.path.basename(local_file) for local_file, _ in local_files]
+        bucket_paths, synapse_containers = self._place_files_from(relative_dir, local_names, synapse_folders,
+                                                                  overflow_layouts)
+
+        container_files = {}
+        for (local_file, local_file_size), bucket_path, synapse_container in zip(local_files, bucket_paths,
+                                                                                  synapse_containers):
+            if bucket_path is None:
+                self._fail_overflow_file(local_file, local_file_size, os.path.dirname(local_file))
+                continue
+            container_files.setdefault(bucket_path, (synapse_container, []))[1].append((local_file, local_file_size))
+
+        for synapse_container, parent_files in container_files.values():
+            self._submit_files(executor, parent_files, synapse_container)
+
+    def _place_files_from(self, relative_dir, names, synapse_folders, overflow_layouts):
+        """Places files and folders in the Synapse folder of a local directory relative to the local path.
+
+        Returns:
+            Tuple of the list of overflow folder paths, None for the names that do not fit, and the list of the
+            Synapse containers, None when the Synapse folder or its overflow folders are not found.
+        """
+        synapse_folder = self._get_files_from_folder(relative_dir, synapse_folders, overflow_layouts)
+        if not synapse_folder:
+            return [()] * len(names), [None] * len(names)
+
+        if relative_dir not in overflow_layouts:
+            overflow_layout = self._get_overflow_layout(synapse_folder, os.path.join(self._local_path, relative_dir))
+            overflow_layouts[relative_dir] = (overflow_layout, {(): synapse_folder}) if overflow_layout else None
+        if not overflow_layouts[relative_dir]:
+            return [()] * len(names), [None] * len(names)
+
+        overflow_layout, synapse_buckets = overflow_layouts[relative_dir]
+        bucket_paths = overflow_layout.place(names)
+        self._create_overflow_folders(bucket_paths, synapse_folder, synapse_buckets)
+        return bucket_paths, [synapse_buckets[path] if path is not None else None for path in bucket_paths]
+
+    def _get_files_from_folder(self, relative_dir, synapse_folders, overflow_layouts):
+        """Gets or creates the Synapse folder for a local directory relative to the local path."""
+        if relative_dir in synapse_folders:
+            return synapse_folders[relative_dir]
+
+        local_dir = os.path.join(self._local_path, relative_dir)
+        [bucket_path], [synapse_parent] = self._place_files_from(os.path.dirname(relative_dir),
+                                                                 [os.path.basename(relative_dir)],
+                                                                 synapse_folders, overflow_layouts)
+        synapse_folder = None
+        if bucket_path is None:
+            self._show_error('[Folder FAILED] {0} : More than {1} files and folders in: {2}'.format(
+                local_dir, self._max_depth, os.path.dirname(local_dir)))
+        elif synapse_parent:
+            synapse_folder = self._create_folder_in_synapse(local_dir, synapse_parent)
+        synapse_folders[relative_dir] = synapse_folder
+        return synapse_folder
+
+    def _pack_files(self, local_path, files, synapse_parent):
+        """Packs the files smaller than the pack threshold into archives.
+
+        Args:
+            local_path: The local directory the files are in.
+            files: The file entries in the directory.
+            synapse_parent: The Synapse container the directory is uploaded to.
+
+        Returns:
+            Tuple of the (local_file, local_file_size) list to upload, including the archives,
+            and a dict of the archives by path.
+        """
+        local_files = []
+        pack_files = []
+        archives = {}
+
         for file_entry in files:
-            if (child_count + 1) >= self._max_depth:
-                parent = self._create_folder_in_synapse('more', parent)
-                child_count = 0
+            try:
+                stat = file_entry.stat()
+            except OSError as ex:
+                # Broken symlinks and files deleted during the walk.
+                self._show_error('[File FAILED] {0} : {1}'.format(file_entry.path, str(ex)))
+                self._write_manifest(ManifestWriter.STATUS_FAILED, file_entry.path, None, error=ex)
+                continue
+
+            if self._pack_threshold and 0 < stat.st_size < self._pack_threshold:
+                pack_files.append((file_entry.path, stat))
+            else:
+                local_files.append((file_entry.path, stat.st_size))
+
+        if len(pack_files) < 2 or not self._can_pack(synapse_parent):
+            local_files.extend((local_file, stat.st_size) for local_file, stat in pack_files)
+            local_files.sort(key=lambda f: os.path.basename(f[0]))
+            return local_files, archives
+
+        local_file_names = set(os.path.basename(local_file) for local_file, _ in local_files)
+        archive_number = 0
+        archive_files = []
+        archive_size = 0
+
+        for index, (local_file, stat) in enumerate(pack_files):
+            archive_files.append((local_file, stat))
+            archive_size += stat.st_size
+
+            if archive_size >= self._pack_size or index == len(pack_files) - 1:
+                archive_number += 1
+                archive_name = self.PACKED_FILES_NAME.format(archive_number)
+                while archive_name in local_file_names:
+                    archive_number += 1
+                    archive_name = self.PACKED_FILES_NAME.format(archive_number)
+
+                archive = PackedArchive(os.path.join(local_path, archive_name), archive_files)
+                archives[archive.path] = archive
+                local_files.append((archive.path, archive.size))
+                archive_files = []
+                archive_size = 0
+
+        return local_files, archives
+
+    def _can_pack(self, synapse_parent):
+        """Gets if files can be packed for a Synapse container. Archives can only be uploaded to Synapse storage."""
+        if not synapse_parent:
+            return False
 
-            executor.submit(self._upload_file_to_synapse, file_entry.path, parent)
-            child_count += 1
+        try:
+            upload_destination = self._call_with_retries('Upload Destination {0}'.format(synapse_parent['id']),
+                                                         self._get_upload_destination,
+                                                         synapse_parent['id'])
+        except Exception as ex:
+            logging.warning('Cannot pack files for: {0} : {1}'.format(synapse_parent['id'], str(ex)))
+            return False
 
-        # Upload the directories.
-        for dir_entry in dirs:
-            if (child_count + 1) >= self._max_depth:
-                parent = self._create_folder_in_synapse('more', parent)
-                child_count = 0
+        return upload_destination['concreteType'] == concrete_types.SYNAPSE_S3_UPLOAD_DESTINATION
 
-            syn_dir = self._create_folder_in_synapse(dir_entry.path, parent)
-            self._upload_folder(executor, dir_entry.path, syn_dir)
-            child_count += 1
+    def _submit_files(self, executor, local_files, synapse_parent, archives=None):
+        if not synapse_parent:
+            for local_file, local_file_size in local_files:
+                self._show_error('Parent not found, cannot execute file: {0}'.format(local_file))
+                self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size,
+                                     error='Parent not found')
+                archive = archives.get(local_file, None) if archives else None
+                if archive:
+                    for packed_file, stat in archive.local_files:
+                        self._write_manifest(ManifestWriter.STATUS_FAILED, packed_file, stat.st_size,
+                                             archive=archive.name, error='Parent not found')
+            return
+
+        for local_file, local_file_size, synapse_child in self._join_synapse_files(local_files, synapse_parent):
+            archive = archives.get(local_file, None) if archives else None
+            if archive:
+                self._scheduler.submit(executor, local_file, local_file_size,
+                                       self._upload_archive_to_synapse, archive, synapse_parent, synapse_child,
+                                       mtime=max(stat.st_mtime for _, stat in archive.local_files))
+            elif self._mirror and not synapse_child:
+                # New files might have been moved or renamed, these are handled after all the containers are known.
+                self._mirror_new_files.append((local_file, local_file_size, synapse_parent))
+            else:
+                self._scheduler.submit(executor, local_file, local_file_size,
+                                       self._upload_file_to_synapse, local_file, local_file_size, synapse_parent,
+                                       synapse_child)
+
+    def _join_synapse_files(self, local_files, synapse_parent):
+        """Joins local files to the child files of a Synapse container by name before anything is hashed.
+
+        Empty files are dropped and files without a remote file of the same name are yielded without a
+        Synapse child so they go straight to upload without any metadata lookups.
+
+        Args:
+            local_files: List of (local_file, local_file_size) tuples.
+            synapse_parent: The Synapse container the files are uploaded to.
+
+        Returns:
+            Generator of (local_file, local_file_size, synapse_child) tuples.
+        """
+        if not local_files and not self._mirror:
+            return
+
+        try:
+            synapse_children = self._call_with_retries('Children {0}'.format(synapse_parent['id']),
+                                                       self._profiled('list', self._get_synapse_children),
+                                                       synapse_parent['id'])
+        except Exception as ex:
+            for local_file, local_file_size in local_files:
+                full_synapse_path = self._get_synapse_path(os.path.basename(local_file), synapse_parent)
+                self._show_error('[File FAILED] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(ex)))
+                self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size,
+                                     synapse_parent=synapse_parent, error=ex)
+            return
+
+        if self._mirror:
+            local_file_names = set(os.path.basename(local_file) for local_file, _ in local_files)
+            for child_name, child_id in synapse_children.items():
+                if child_name not in local_file_names and \
+                        not self._is_mirror_excluded(synapse_parent['id'], child_name, False):
+                    self._mirror_orphan_files.append({'name': child_name, 'id': child_id})
+
+        for local_file, local_file_size in local_files:
+            # Skip empty files since these will error when uploading via the synapseclient.
+            if local_file_size < 1:
+                logging.info('Skipping empty file: {0}'.format(local_file))
+                self._write_manifest(ManifestWriter.STATUS_SKIPPED, local_file, local_file_size,
+                                     synapse_parent=synapse_parent)
+                continue
+
+            local_file_name = os.path.basename(local_file)
+            child_id = synapse_children.get(local_file_name, None)
+            synapse_child = {'name': local_file_name, 'id': child_id} if child_id else None
+            yield local_file, local_file_size, synapse_child
 
     def _create_folder_in_synapse(self, path, synapse_parent):
         synapse_folder = None
@@ -163,6 +730,19 @@ class SynapseUploader:
         folder_name = os.path.basename(path)
         full_synapse_path = self._get_synapse_path(folder_name, synapse_parent)
 
+        # Existing folders are found in the parent's listing, which is also used to join the parent's files.
+        try:
+            synapse_folders = self._call_with_retries('Children {0}'.format(synapse_parent['id']),
+                                                      self._profiled('list', self._synapse_children.get_folders),
+                                                      synapse_parent['id'])
+        except Exception as ex:
+            logging.warning('Cannot get folders in: {0} : {1}'.format(synapse_parent['id'], str(ex)))
+            synapse_folders = None
+
+        folder_id = synapse_folders.get(folder_name, None) if synapse_folders is not None else None
+        if folder_id:
+            synapse_folder = syn.Folder(name=folder_name, parent=synapse_parent, id=folder_id)
+
         max_attempts = 5
         attempt_number = 0
         exception = None
@@ -171,35 +751,38 @@ class SynapseUploader:
             try:
                 attempt_number += 1
                 exception = None
-                synapse_folder = Synapsis.store(syn.Folder(name=folder_name, parent=synapse_parent),
-                                                forceVersion=self._force_upload)
+                with self._profiler.stage('folder'):
+                    synapse_folder = Synapsis.store(syn.Folder(name=folder_name, parent=synapse_parent),
+                                                    forceVersion=self._force_upload)
             except Exception as ex:
                 exception = ex
                 logging.error('[Folder ERROR] {0} -> {1} : {2}'.format(path, full_synapse_path, str(ex)))
                 if attempt_number < max_attempts:
                     sleep_time = random.randint(1, 5)
                     logging.info('[Folder RETRY in {0}s] {1} -> {2}'.format(sleep_time, path, full_synapse_path))
-                    time.sleep(sleep_time)
+                    self._retry_sleep(sleep_time)
 
         if exception:
             self._show_error('[Folder FAILED] {0} -> {1} : {2}'.format(path, full_synapse_path, str(exception)))
         else:
             logging.info('[Folder] {0} -> {1}'.format(path, full_synapse_path))
+            if synapse_folders is not None and not folder_id:
+                # The folder is new, its children never need to be listed.
+                self._synapse_children.set_empty(synapse_folder.id)
             self._set_synapse_parent(synapse_folder)
+            if synapse_parent['id'] in self._mirror_containers:
+                self._mirror_containers[synapse_parent['id']].add(folder_name)
 
         return synapse_folder
 
-    def _upload_file_to_synapse(self, local_file, synapse_parent):
+    def _upload_file_to_synapse(self, local_file, local_file_size, synapse_parent, synapse_child, local_md5=None):
         synapse_file = None
+        started = time.time()
 
         if not synapse_parent:
             self._show_error('Parent not found, cannot execute file: {0}'.format(local_file))
-            return synapse_file
-
-        # Skip empty files since these will error when uploading via the synapseclient.
-        local_file_size = os.path.getsize(local_file)
-        if local_file_size < 1:
-            logging.info('Skipping empty file: {0}'.format(local_file))
+            self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size, started=started,
+                                 error='Parent not found')
             return synapse_file
 
         file_name = os.path.basename(local_file)
@@ -209,6 +792,10 @@ class SynapseUploader:
         attempt_number = 0
         exception = None
         log_success_prefix = 'File'
+        manifest_status = ManifestWriter.STATUS_UPLOADED
+
+        # The remote file and local MD5 are only fetched/calculated once and reused across retries.
+        remote_file = None
 
         while attempt_number < max_attempts and not synapse_file:
             try:
@@ -216,62 +803,516 @@ class SynapseUploader:
                 exception = None
                 needs_upload = True
 
-                file_obj = self._find_synapse_file(synapse_parent['id'], local_file)
+                if synapse_child and not remote_file:
+                    with self._profiler.stage('lookup'):
+                        remote_file = self._find_synapse_file(synapse_parent['id'], local_file,
+                                                               synapse_child=synapse_child)
+
+                file_obj = remote_file
                 if file_obj:
-                    file_obj.path = local_file
                     if self._force_upload:
                         Synapsis.cache.remove(file_obj)
-                    else:
-                        if file_obj['_file_handle']['contentSize'] == local_file_size and \
-                                file_obj['_file_handle']['contentMd5'] == Utils.get_md5(local_file):
+                    elif file_obj['_file_handle']['contentSize'] == local_file_size:
+                        if local_md5 is None:
+                            local_md5 = self._get_md5(local_file)
+                        if file_obj['_file_handle']['contentMd5'] == local_md5:
                             needs_upload = False
                             log_success_prefix = 'File is Current'
+                            manifest_status = ManifestWriter.STATUS_CURRENT
+                            synapse_file = file_obj
                 else:
-                    file_obj = syn.File(path=local_file, name=file_name, parent=synapse_parent)
+                    file_obj = syn.File(name=file_name, parent=synapse_parent)
 
                 if needs_upload or self._force_upload:
-                    synapse_file = Synapsis.store(file_obj, forceVersion=self._force_upload)
+                    # Hash before uploading so a failed upload is retried without hashing the file again.
+                    if local_md5 is None and self._is_synapse_storage(synapse_parent['id']):
+                        local_md5 = self._get_md5(local_file)
+                    synapse_file, deduplicated, local_md5 = self._store_file(file_obj, local_file, local_md5=local_md5)
+                    if deduplicated:
+                        log_success_prefix = 'File Deduplicated'
+                        manifest_status = ManifestWriter.STATUS_DEDUPLICATED
             except Exception as ex:
                 exception = ex
                 logging.error('[File ERROR] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(ex)))
                 if attempt_number < max_attempts:
                     sleep_time = random.randint(1, 5)
                     logging.info('[File RETRY in {0}s] {1} -> {2}'.format(sleep_time, local_file, full_synapse_path))
-                    time.sleep(sleep_time)
+                    self._retry_sleep(sleep_time)
 
         if exception:
             self._show_error('[File FAILED] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(exception)))
+            self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size, started=started,
+                                 synapse_parent=synapse_parent, md5=local_md5, error=exception)
         else:
             logging.info('[{0}] {1} -> {2}'.format(log_success_prefix, local_file, full_synapse_path))
+            self._write_manifest(manifest_status, local_file, local_file_size, started=started,
+                                 synapse_parent=synapse_parent, synapse_file=synapse_file, md5=local_md5)
 
         return synapse_file
 
-    def _find_synapse_file(self, synapse_parent_id, local_file_path):
-        """Finds a Synapse file by its parent and local_file name."""
-        children = self._get_synapse_children(synapse_parent_id)
+    def _upload_archive_to_synapse(self, archive, synapse_parent, synapse_child):
+        synapse_file = None
+        started = time.time()
+        local_name = '{0} ({1} files)'.format(archive.path, len(archive.local_files))
+        full_synapse_path = self._get_synapse_path(archive.name, synapse_parent)
+
+        max_attempts = 5
+        attempt_number = 0
+        exception = None
+        log_success_prefix = 'Packed Files'
+        manifest_status = ManifestWriter.STATUS_UPLOADED
+        archive_md5 = None
 
-        for child in children:
-            if child['name'] == os.path.basename(local_file_path):
-                syn_file = Synapsis.get(child['id'], downloadFile=False)
-                # Synapse can store a file with two names: 1) The entity name 2) the actual filename.
-                # Check that the actual filename matches the local file name to ensure we have the same file.
-                if syn_file['_file_handle']['fileName'] != os.path.basename(local_file_path):
-                    for find_child in children:
-                        if find_child == child:
-                            continue
-                        syn_child = Synapsis.get(find_child['id'], downloadFile=False)
-                        if syn_child['_file_handle']['fileName'] == os.path.basename(local_file_path):
-                            return syn_child
-                return syn_file
+        # The remote file is only fetched once and reused across retries.
+        remote_file = None
 
+        while attempt_number < max_attempts and not synapse_file:
+            try:
+                attempt_number += 1
+                exception = None
+
+                if synapse_child and not remote_file:
+                    with self._profiler.stage('lookup'):
+                        remote_file = self._find_synapse_file(synapse_parent['id'], archive.path,
+                                                              synapse_child=synapse_child)
+
+                with self._profiler.stage('hash'):
+                    archive_md5 = archive.get_md5()
+
+                file_obj = remote_file
+                if file_obj and not self._force_upload and \
+                        file_obj['_file_handle']['contentSize'] == archive.size and \
+                        file_obj['_file_handle']['contentMd5'] == archive_md5:
+                    log_success_prefix = 'Packed Files are Current'
+                    manifest_status = ManifestWriter.STATUS_CURRENT
+                    synapse_file = file_obj
+                else:
+                    if not file_obj:
+                        file_obj = syn.File(name=archive.name, parent=synapse_parent)
+
+                    upload_destination = self._get_upload_destination(synapse_parent['id'])
+                    file_obj.dataFileHandleId = self._upload_file_handle(archive.name,
+                                                                         archive.size,
+                                                                         archive_md5,
+                                                                         upload_destination['storageLocationId'],
+                                                                         archive.read)
+                    file_obj['packedFileCount'] = len(archive.local_files)
+                    with self._profiler.stage('store'):
+                        synapse_file = Synapsis.store(file_obj, forceVersion=self._force_upload)
+            except Exception as ex:
+                exception = ex
+                logging.error('[Packed Files ERROR] {0} -> {1} : {2}'.format(local_name, full_synapse_path, str(ex)))
+                if attempt_number < max_attempts:
+                    sleep_time = random.randint(1, 5)
+                    logging.info(
+                        '[Packed Files RETRY in {0}s] {1} -> {2}'.format(sleep_time, local_name, full_synapse_path))
+                    self._retry_sleep(sleep_time)
+
+        if exception:
+            self._show_error(
+                '[Packed Files FAILED] {0} -> {1} : {2}'.format(local_name, full_synapse_path, str(exception)))
+            manifest_status = ManifestWriter.STATUS_FAILED
+        else:
+            logging.info('[{0}] {1} -> {2}'.format(log_success_prefix, local_name, full_synapse_path))
+
+        self._write_manifest(manifest_status, archive.path, archive.size, started=started,
+                             synapse_parent=synapse_parent, synapse_file=synapse_file, md5=archive_md5,
+                             error=exception)
+        for local_file, stat in archive.local_files:
+            self._write_manifest(ManifestWriter.STATUS_FAILED if exception else ManifestWriter.STATUS_PACKED,
+                                 local_file, stat.st_size, started=started, synapse_parent=synapse_parent,
+                                 synapse_file=synapse_file, archive=archive.name, error=exception)
+
+        return synapse_file
+
+    def _add_mirror_container(self, synapse_container):
+        if self._mirror and synapse_container:
+            self._mirror_containers.setdefault(synapse_container['id'], set())
+
+    def _is_mirror_excluded(self, container_id, name, is_dir):
+        """Gets if a remote file or folder is excluded locally, excluded remote children are not orphans."""
+        relative_dir, excluded_names = self._mirror_excluded.get(container_id, ('', set()))
+        if name in excluded_names:
+            return True
+        if self._path_filter.is_empty:
+            return False
+        # Remote files can only be matched by name, their local size and modification time are not known.
+        relative_path = relative_dir + name
+        if is_dir:
+            return self._path_filter.is_dir_excluded(relative_path)
+        return self._path_filter.is_file_excluded(relative_path)
+
+    def _mirror_folder(self):
+        """Applies local moves, renames, and optionally deletes to the mirrored Synapse containers.
+
+        Remote files that no longer exist locally are indexed by size and MD5. New local files with the same
+        content are moved/renamed in Synapse instead of being uploaded again.
+        """
+        with self._new_executor() as executor:
+            # Find the remote folders that no longer exist locally and the files within them.
+            for container_id, synapse_folders in zip(self._mirror_containers.keys(),
+                                                     executor.map(self._get_synapse_folders,
+                                                                  self._mirror_containers.keys())):
+                for synapse_folder in synapse_folders:
+                    if synapse_folder['name'] not in self._mirror_containers[container_id] and \
+                            not self._is_mirror_excluded(container_id, synapse_folder['name'], True):
+                        self._mirror_orphan_folders.append(synapse_folder)
+
+            orphan_files = list(self._mirror_orphan_files)
+            for folder_files in executor.map(self._get_synapse_folder_files, self._mirror_orphan_folders):
+                orphan_files.extend(folder_files)
+
+            # Index the remote files that no longer exist locally by size and MD5.
+            for remote_file in executor.map(self._get_mirror_file, orphan_files):
+                if remote_file:
+                    file_handle = remote_file['_file_handle']
+                    key = (file_handle.get('contentSize'), file_handle.get('contentMd5'))
+                    self._mirror_index.setdefault(key, []).append(remote_file)
+                    self._mirror_index_sizes.add(key[0])
+
+            futures = [self._scheduler.submit(executor, local_file, local_file_size,
+                                              self._mirror_file_to_synapse, local_file, local_file_size, synapse_parent)
+                       for local_file, local_file_size, synapse_parent in self._mirror_new_files]
+            concurrent.futures.wait(futures)
+            for future in futures:
+                if future.exception():
+                    self._show_error('[Mirror FAILED] {0}'.format(str(future.exception())))
+
+            if self._trash:
+                if self.errors:
+                    logging.warning('Not moving remote files or folders to the trash because of errors.')
+                    return
+
+                trash_entities = [f for f in self._mirror_orphan_files if f['id'] not in self._mirror_claimed_ids]
+                trash_entities.extend(self._mirror_orphan_folders)
+                for synapse_entity in trash_entities:
+                    executor.submit(self._trash_in_synapse, synapse_entity)
+
+    def _get_synapse_folders(self, synapse_parent_id):
+        """Gets the child folders metadata for a parent Synapse container."""
+        try:
+            return self._call_with_retries('Folders {0}'.format(synapse_parent_id),
+                                           lambda: list(Synapsis.getChildren(synapse_parent_id,
+                                                                             includeTypes=['folder'])))
+        except Exception as ex:
+            self._show_error('[Mirror FAILED] Cannot get folders in: {0} : {1}'.format(synapse_parent_id, str(ex)))
+            return []
+
+    def _get_synapse_folder_files(self, synapse_folder):
+        """Gets the metadata of all the files under a Synapse folder."""
+        synapse_files = []
+        try:
+            children = self._call_with_retries('Children {0}'.format(synapse_folder['id']),
+                                               lambda: list(Synapsis.getChildren(synapse_folder['id'],
+                                                                                 includeTypes=['folder', 'file'])))
+        except Exception as ex:
+            self._show_error('[Mirror FAILED] Cannot get children in: {0} : {1}'.format(synapse_folder['id'], str(ex)))
+            return synapse_files
+
+        for child in children:
+            if child['type'] == 'org.sagebionetworks.repo.model.Folder':
+                synapse_files.extend(self._get_synapse_folder_files(child))
+            else:
+                synapse_files.append(child)
+
+        return synapse_files
+
+    def _get_mirror_file(self, synapse_child):
+        try:
+            return self._call_with_retries('File {0}'.format(synapse_child['id']),
+                                           Synapsis.get, synapse_child['id'], downloadFile=False)
+        except Exception as ex:
+            # The file can still be trashed but it cannot be moved.
+            logging.error('[Mirror ERROR] Cannot get file: {0} : {1}'.format(synapse_child['id'], str(ex)))
+            return None
+
+    def _claim_mirror_file(self, local_file_size, local_md5):
+        """Claims a remote file with the same content so it is only moved to one local file."""
+        with self._thread_lock:
+            remote_files = self._mirror_index.get((local_file_size, local_md5), None)
+            if remote_files:
+                remote_file = remote_files.pop(0)
+                self._mirror_claimed_ids.add(remote_file.id)
+                return remote_file
         return None
 
-    LRU_MAXSIZE = (os.cpu_count() or 1) * 5
+    def _mirror_file_to_synapse(self, local_file, local_file_size, synapse_parent):
+        local_md5 = None
+
+        # Only hash files that have a remote file of the same size to move.
+        if local_file_size in self._mirror_index_sizes:
+            try:
+                local_md5 = self._get_md5(local_file)
+            except Exception as ex:
+                full_synapse_path = self._get_synapse_path(os.path.basename(local_file), synapse_parent)
+                self._show_error('[File FAILED] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(ex)))
+                self._write_manifest(ManifestWriter.STATUS_FAILED, local_file, local_file_size,
+                                     synapse_parent=synapse_parent, error=ex)
+                return None
+            remote_file = self._claim_mirror_file(local_file_size, local_md5)
+            if remote_file:
+                return self._move_file_in_synapse(remote_file, local_file, synapse_parent, local_md5=local_md5)
+
+        return self._upload_file_to_synapse(local_file, local_file_size, synapse_parent, None, local_md5=local_md5)
+
+    def _move_file_in_synapse(self, remote_file, local_file, synapse_parent, local_md5=None):
+        """Moves and renames a remote file to match a local file without uploading it."""
+        synapse_file = None
+        started = time.time()
+        file_name = os.path.basename(local_file)
+        full_synapse_path = self._get_synapse_path(file_name, synapse_parent)
+
+        max_attempts = 5
+        attempt_number = 0
+        exception = None
+
+        while attempt_number < max_attempts and not synapse_file:
+            try:
+                attempt_number += 1
+                exception = None
+                if remote_file['_file_handle']['fileName'] != file_name:
+                    remote_file.dataFileHandleId = self._copy_file_handle(remote_file, file_name)
+                remote_file.name = file_name
+                remote_file.parentId = synapse_parent['id']
+                with self._profiler.stage('store'):
+                    synapse_file = Synapsis.store(remote_file, forceVersion=False)
+            except Exception as ex:
+                exception = ex
+                logging.error('[File Move ERROR] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(ex)))
+                if attempt_number < max_attempts:
+                    sleep_time = random.randint(1, 5)
+                    logging.info(
+                        '[File Move RETRY in {0}s] {1} -> {2}'.format(sleep_time, local_file, full_synapse_path))
+                    self._retry_sleep(sleep_time)
+
+        if exception:
+            self._show_error(
+                '[File Move FAILED] {0} -> {1} : {2}'.format(local_file, full_synapse_path, str(exception)))
+        else:
+            logging.info('[File Moved] {0} -> {1} ({2})'.format(local_file, full_synapse_path, synapse_file.id))
+
+        self._write_manifest(ManifestWriter.STATUS_FAILED if exception else ManifestWriter.STATUS_MOVED,
+                             local_file, remote_file['_file_handle']['contentSize'], started=started,
+                             synapse_parent=synapse_parent, synapse_file=synapse_file, md5=local_md5,
+                             error=exception)
+
+        return synapse_file
+
+    def _copy_file_handle(self, synapse_file, file_name):
+        """Copies the file handle of a Synapse file with a new file name. The file content is not copied."""
+        copy_request = {
+            'copyRequests': [{
+                'originalFile': {
+                    'fileHandleId': synapse_file.dataFileHandleId,
+                    'associateObjectId': synapse_file.id,
+                    'associateObjectType': 'FileEntity'
+                },
+                'newFileName': file_name
+            }]
+        }
+        copy_response = Synapsis.restPOST('/filehandles/copy',
+                                          body=json.dumps(copy_request),
+                                          endpoint=Synapsis.fileHandleEndpoint)
+        copy_result = copy_response['copyResults'][0]
+        if copy_result.get('failureCode', None) is not None:
+            raise SynapsisError('Error copying filehandle: {0}, dataFileHandleId: {1}'.format(
+                copy_result['failureCode'], copy_result['originalFileHandleId']))
+        return copy_result['newFileHandle']['id']
+
+    def _trash_in_synapse(self, synapse_entity):
+        try:
+            self._call_with_retries('Trash {0}'.format(synapse_entity['id']), Synapsis.delete, synapse_entity['id'])
+            logging.info('[Trashed] {0} ({1})'.format(synapse_entity['name'], synapse_entity['id']))
+            self._write_manifest(ManifestWriter.STATUS_TRASHED, None, None, synapse_file=synapse_entity)
+        except Exception as ex:
+            self._show_error('[Trash FAILED] {0} ({1}) : {2}'.format(synapse_entity['name'],
+                                                                   synapse_entity['id'],
+                                                                   str(ex)))
+            self._write_manifest(ManifestWriter.STATUS_FAILED, None, None, synapse_file=synapse_entity, error=ex)
+
+    def _store_file(self, file_obj, local_file, local_md5=None):
+        """Uploads the local file and stores the Synapse File.
+
+        Files going to Synapse storage are uploaded with an already calculated MD5 so the synapseclient
+        does not read and hash the file a second time. Content that was already uploaded during this run is
+        not uploaded again, the new File reuses the existing file handle (or a copy of it when the file name
+        differs). Other storage locations are stored by the synapseclient.
+
+        Returns:
+            Tuple of the stored Synapse File, whether an existing file handle was reused, and the local MD5
+            (None if it was not calculated).
+        """
+        upload_destination = self._get_upload_destination(file_obj['parentId'])
+
+        if upload_destination['concreteType'] != concrete_types.SYNAPSE_S3_UPLOAD_DESTINATION:
+            file_obj.path = local_file
+            with self._profiler.stage('store'):
+                synapse_file = Synapsis.store(file_obj, forceVersion=self._force_upload)
+            return synapse_file, False, synapse_file.get('_file_handle', {}).get('contentMd5', local_md5)
+
+        if local_md5 is None:
+            local_md5 = self._get_md5(local_file)
+
+        synapse_file, deduplicated = self._store_content_file(file_obj,
+                                                              local_file,
+                                                              local_md5,
+                                                              upload_destination['storageLocationId'])
+        return synapse_file, deduplicated, local_md5
+
+    def _store_content_file(self, file_obj, local_file, local_md5, storage_location_id):
+        """Stores a Synapse File for the content of a local file, uploading the content once per run.
+
+        Threads uploading the same content at the same time wait for the first File to be stored. Files reusing
+        the content under a different file name get a renamed copy of the file handle.
+
+        Returns:
+            Tuple of the stored Synapse File and whether an existing file handle was reused.
+        """
+        local_file_name = os.path.basename(local_file)
+        local_file_size = os.path.getsize(local_file)
+        content_key = (storage_location_id, local_file_size, local_md5)
+
+        with self._thread_lock:
+            content_future = self._content_file_handles.get(content_key, None)
+            is_uploader = content_future is None
+            if is_uploader:
+                content_future = concurrent.futures.Future()
+                self._content_file_handles[content_key] = content_future
+
+        if is_uploader:
+            try:
+                file_handle_id = self._upload_file_handle(local_file_name,
+                                                          local_file_size,
+                                                          local_md5,
+                                                          storage_location_id,
+                                                          functools.partial(Utils.read_range, local_file))
+                synapse_file = self._store_file_handle(file_obj, file_handle_id, local_file)
+            except Exception as ex:
+                # Let the next attempt upload the content again.
+                with self._thread_lock:
+                    self._content_file_handles.pop(content_key, None)
+                content_future.set_exception(ex)
+                raise
+            content_future.set_result((synapse_file, local_file_name))
+            return synapse_file, False
+
+        content_file, content_file_name = content_future.result()
+        file_handle_id = content_file.dataFileHandleId
+        if content_file_name != local_file_name:
+            # The file handle carries the file name, a File with another name needs its own copy of the handle.
+            rename_key = (content_key, local_file_name)
+            with self._thread_lock:
+                renamed_file_handle_id = self._renamed_file_handles.get(rename_key, None)
+            if renamed_file_handle_id is None:
+                renamed_file_handle_id = self._copy_file_handle(content_file, local_file_name)
+                with self._thread_lock:
+                    self._renamed_file_handles[rename_key] = renamed_file_handle_id
+            file_handle_id = renamed_file_handle_id
+
+        return self._store_file_handle(file_obj, file_handle_id, local_file), True
+
+    def _store_file_handle(self, file_obj, file_handle_id, local_file):
+        """Stores a Synapse File with an uploaded file handle."""
+        file_obj.dataFileHandleId = file_handle_id
+        with self._profiler.stage('store'):
+            synapse_file = Synapsis.store(file_obj, forceVersion=self._force_upload)
+        Synapsis.cache.add(file_handle_id, local_file)
+        return synapse_file
+
+    def _upload_file_handle(self, file_name, file_size, md5, storage_location_id, read_fn):
+        """Multipart uploads content to Synapse storage and returns the new file handle ID.
+
+        Args:
+            file_name: The file name of the content.
+            file_size: The size of the content.
+            md5: The MD5 of the content.
+            storage_location_id: The storage location to upload to.
+            read_fn: Function that reads the content given an offset and length.
+
+        Returns:
+            The file handle ID.
+        """
+        part_size = multipart_upload._get_part_size(None, file_size)
+        content_type = mimetypes.guess_type(file_name, strict=False)[0] or 'application/octet-stream'
+
+        upload_request = {
+            'concreteType': concrete_types.MULTIPART_UPLOAD_REQUEST,
+            'contentType': content_type,
+            'contentMD5Hex': md5,
+            'fileName': file_name,
+            'fileSizeBytes': file_size,
+            'generatePreview': True,
+            'partSizeBytes': part_size,
+            'storageLocationId': storage_location_id
+        }
+
+        def part_fn(part_number):
+            with self._profiler.stage('read'):
+                part = read_fn((part_number - 1) * part_size, part_size)
+            if part and (self._bandwidth_limiter.enabled or self._profiler.enabled):
+                # Wait on the limiter while the part is sent instead of once for the whole part, and record the
+                # time sending it apart from the time waiting on the limiter.
+                return UploadBody(part, self._bandwidth_limiter, profiler=self._profiler)
+            return part
+
+        def md5_fn(part, _):
+            return hashlib.md5(part.data if isinstance(part, UploadBody) else part).hexdigest()
+
+        # The parts are profiled as they are read and sent, the multipart upload is not a stage of its own so
+        # the time waiting on the bandwidth limiter is not nested in it.
+        return multipart_upload._multipart_upload(Synapsis.Synapse,
+                                                  file_name,
+                                                  upload_request,
+                                                  part_fn,
+                                                  md5_fn,
+                                                  max_threads=Synapsis.Synapse.max_threads)
+
+    @functools.lru_cache(maxsize=None)
+    def _get_upload_destination(self, synapse_parent_id):
+        """Gets the default upload destination for a parent Synapse container."""
+        return Synapsis._getDefaultUploadDestination(synapse_parent_id)
+
+    def _is_synapse_storage(self, synapse_parent_id):
+        """Gets if files in a parent Synapse container are uploaded to Synapse storage."""
+        upload_destination = self._get_upload_destination(synapse_parent_id)
+        return upload_destination['concreteType'] == concrete_types.SYNAPSE_S3_UPLOAD_DESTINATION
+
+    def _find_synapse_file(self, synapse_parent_id, local_file_path, synapse_child=None):
+        """Finds a Synapse file by its parent and local_file name.
+
+        The child matching the local_file name can be passed in when it is already known.
+        """
+        local_file_name = os.path.basename(local_file_path)
+
+        if not synapse_child:
+            child_id = self._get_synapse_children(synapse_parent_id).get(local_file_name, None)
+            if not child_id:
+                return None
+            synapse_child = {'name': local_file_name, 'id': child_id}
+
+        syn_file = Synapsis.get(synapse_child['id'], downloadFile=False)
+        # Synapse can store a file with two names: 1) The entity name 2) the actual filename.
+        # Check that the actual filename matches the local file name to ensure we have the same file.
+        if syn_file['_file_handle']['fileName'] != local_file_name:
+            for child_id in self._get_synapse_children(synapse_parent_id).values():
+                if child_id == synapse_child['id']:
+                    continue
+                syn_child = Synapsis.get(child_id, downloadFile=False)
+                if syn_child['_file_handle']['fileName'] == local_file_name:
+                    return syn_child
+        return syn_file
 
-    @functools.lru_cache(maxsize=LRU_MAXSIZE, typed=True)
     def _get_synapse_children(self, synapse_parent_id):
-        """Gets the child files metadata for a parent Synapse container."""
-        return list(Synapsis.getChildren(synapse_parent_id, includeTypes=["file"]))
+        """Gets the child file names and IDs for a parent Synapse container.
+
+        Returns:
+            Dict of child name -> child ID.
+        """
+        return self._synapse_children.get(synapse_parent_id)
+
+    @staticmethod
+    def _list_synapse_children(synapse_parent_id):
+        return Synapsis.getChildren(synapse_parent_id, includeTypes=['folder', 'file'])
 
     def _set_synapse_parent(self, parent):
         with self._thread_lock:
@@ -296,21 +1337,140 @@ class SynapseUploader:
 
         return os.path.join(*segments)
 
-    def _get_dirs_and_files(self, local_path):
+    def _get_relative_dir(self, local_path):
+        """Gets the path of a local directory relative to the local path for filtering, e.g. "" or "a/b/"."""
+        relative_dir = os.path.relpath(local_path, self._local_path)
+        if relative_dir == os.curdir:
+            return ''
+        return relative_dir.replace(os.sep, '/') + '/'
+
+    def _get_dirs_and_files(self, local_path, relative_dir=''):
+        """Gets the directories and files in a local directory.
+
+        Excluded directories and files are filtered out here so excluded directories are never descended into.
+
+        Returns:
+            Tuple of the directory entries, the file entries, and the excluded names.
+        """
         dirs = []
         files = []
+        excluded_names = []
+        path_filter = None if self._path_filter.is_empty else self._path_filter
 
         with os.scandir(local_path) as iter:
             for entry in iter:
                 if entry.is_dir(follow_symlinks=False):
-                    dirs.append(entry)
+                    if path_filter and path_filter.is_dir_excluded(relative_dir + entry.name):
+                        excluded_names.append(entry.name)
+                        logging.debug('Excluded: {0}'.format(entry.path))
+                    else:
+                        dirs.append(entry)
                 else:
-                    files.append(entry)
+                    if path_filter and path_filter.is_file_excluded(relative_dir + entry.name,
+                                                                    self._get_stat(entry) if path_filter.needs_stat
+                                                                    else None):
+                        excluded_names.append(entry.name)
+                        logging.debug('Excluded: {0}'.format(entry.path))
+                    else:
+                        files.append(entry)
 
         dirs.sort(key=lambda f: f.name)
         files.sort(key=lambda f: f.name)
 
-        return dirs, files
+        return dirs, files, excluded_names
+
+    @staticmethod
+    def _get_stat(entry):
+        """Gets the stat of a directory entry, None if it cannot be read. Unreadable files are reported later."""
+        try:
+            return entry.stat()
+        except OSError:
+            return None
+
+    def _get_thread_count(self):
+        """Gets the number of threads each thread pool uses."""
+        # Same default as concurrent.futures.ThreadPoolExecutor.
+        return self._max_threads or min(32, (os.cpu_count() or 1) + 4)
+
+    def _new_executor(self):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self._max_threads, initializer=self._init_thread)
+
+    def _init_thread(self):
+        # Multipart uploads use an HTTP session per thread, pool its connections the same way.
+        if self._connection_pool:
+            multipart_upload._thread_local.session = self._connection_pool.mount()
+        self._profiler.add_thread()
+
+    def _get_md5(self, local_file):
+        with self._profiler.stage('hash'):
+            return Utils.get_md5(local_file)
+
+    def _retry_sleep(self, sleep_time):
+        with self._profiler.stage('retry sleep'):
+            time.sleep(sleep_time)
+
+    def _profiled(self, stage, func):
+        """Wraps func so its calls are recorded as a profiler stage."""
+
+        @functools.wraps(func)
+        def profiled_func(*args, **kwargs):
+            with self._profiler.stage(stage):
+                return func(*args, **kwargs)
+
+        return profiled_func
+
+    def _write_manifest(self, status, local_file, local_file_size, started=None, synapse_parent=None,
+                        synapse_file=None, md5=None, archive=None, error=None):
+        if not self._manifest:
+            return
+
+        self._manifest.write({
+            'local_path': local_file,
+            'size': local_file_size,
+            'md5': md5,
+            'synapse_id': synapse_file['id'] if synapse_file else None,
+            'version': synapse_file.get('versionNumber', None) if synapse_file else None,
+            'parent_id': synapse_parent['id'] if synapse_parent else None,
+            'status': status,
+            'archive': archive,
+            'started': datetime.fromtimestamp(started).isoformat() if started else None,
+            'seconds': round(time.time() - started, 3) if started else None,
+            'error': str(error) if error else None
+        })
+
+    def _write_profile(self):
+        self._profiler.stop()
+        logging.info('')
+        for line in self._profiler.get_report().splitlines():
+            logging.info(line)
+
+        if self._profile_path:
+            self._profiler.write_report(self._profile_path)
+            logging.info('Profile written to: {0}'.format(self._profile_path))
+
+        if self._profile_stacks_path:
+            self._profiler.write_stacks(self._profile_stacks_path)
+            logging.info('Profile stacks written to: {0}'.format(self._profile_stacks_path))
+
+    def _call_with_retries(self, label, func, *args, **kwargs):
+        """Calls func and retries it on failure the same way folder and file uploads are retried.
+
+        Raises the last exception if all attempts fail.
+        """
+        max_attempts = 5
+        attempt_number = 0
+
+        while True:
+            try:
+                attempt_number += 1
+                return func(*args, **kwargs)
+            except Exception as ex:
+                logging.error('[{0} ERROR] {1}'.format(label, str(ex)))
+                if attempt_number >= max_attempts:
+                    raise
+                sleep_time = random.randint(1, 5)
+                logging.info('[{0} RETRY in {1}s]'.format(label, sleep_time))
+                self._retry_sleep(sleep_time)
 
     def _show_error(self, msg):
         self.errors.append(msg)
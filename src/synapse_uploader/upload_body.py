@@ -0,0 +1,43 @@
+import contextlib
+from .utils import Utils
+
+
+class UploadBody:
+    """Request body for an upload part that is sent in chunks.
+
+    requests streams an iterable body with a known length, so the bandwidth limiter is waited on before each
+    chunk is sent and the limit holds while a part is being sent. Each request iterates the body from the start,
+    a retried request sends the whole part again. The time waiting on the limiter and the time sending are
+    profiled as separate stages.
+    """
+    CHUNK_SIZE = 64 * Utils.KB
+
+    def __init__(self, data, bandwidth_limiter, profiler=None, chunk_size=CHUNK_SIZE):
+        """
+        Args:
+            data: The bytes of the part.
+            bandwidth_limiter: The BandwidthLimiter to wait on before sending each chunk.
+            profiler: The Profiler the time waiting on the limiter and the time sending are recorded to.
+            chunk_size: The number of bytes sent at a time.
+        """
+        self.data = data
+        self._bandwidth_limiter = bandwidth_limiter
+        self._profiler = profiler
+        self._chunk_size = chunk_size
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        view = memoryview(self.data)
+        for offset in range(0, len(view), self._chunk_size):
+            chunk = view[offset:offset + self._chunk_size]
+            if self._bandwidth_limiter.enabled:
+                with self._stage('throttle'):
+                    self._bandwidth_limiter.acquire(len(chunk))
+            # The chunk is sent while the iteration is suspended.
+            with self._stage('upload'):
+                yield chunk
+
+    def _stage(self, name):
+        return self._profiler.stage(name) if self._profiler else contextlib.nullcontext()
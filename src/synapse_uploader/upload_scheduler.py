@@ -0,0 +1,109 @@
+import os
+import heapq
+import fnmatch
+import threading
+
+
+class UploadScheduler:
+    """Orders the uploads waiting for a thread.
+
+    Each submitted upload adds one task to the executor, the task runs the best upload waiting when a thread
+    picks it up. Uploads are ordered by:
+        1. The first priority pattern they match, uploads not matching any pattern go last.
+        2. When fair, the top-level directory that has started the fewest uploads.
+        3. The order policy.
+    """
+    ORDER_NAME = 'name'
+    ORDER_SMALLEST = 'smallest'
+    ORDER_LARGEST = 'largest'
+    ORDER_NEWEST = 'newest'
+    ORDERS = [ORDER_NAME, ORDER_SMALLEST, ORDER_LARGEST, ORDER_NEWEST]
+
+    def __init__(self, local_path, order=ORDER_NAME, priorities=None, fair=False):
+        """
+        Args:
+            local_path: The local directory being uploaded, paths are matched relative to it.
+            order: The order policy. One of ORDERS, 'name' keeps the order the uploads are submitted in.
+            priorities: List of glob patterns, matched against the relative path and the file name.
+            fair: Whether to take turns between the top-level directories.
+        """
+        if order not in self.ORDERS:
+            raise ValueError('Invalid order: {0}'.format(order))
+
+        self._local_path = local_path
+        self._order = order
+        self._priorities = priorities or []
+        self._fair = fair
+        self._lock = threading.Lock()
+        self._sequence = 0
+        # (priority, group) -> heap of (order_key, sequence, fn, args)
+        self._queues = {}
+        self._started = {}
+
+    @property
+    def is_fifo(self):
+        """Gets if uploads run in the order they are submitted."""
+        return self._order == self.ORDER_NAME and not self._priorities and not self._fair
+
+    def submit(self, executor, local_file, local_file_size, fn, *args, mtime=None):
+        """Queues an upload and adds a task for it to the executor.
+
+        Args:
+            executor: The executor to run the upload on.
+            local_file: The path of the local file being uploaded.
+            local_file_size: The size of the local file.
+            fn: The upload function.
+            *args: The upload function arguments.
+            mtime: The modification time of the local file. The local file is stat'd when it is needed and not set.
+        """
+        if self.is_fifo:
+            return executor.submit(fn, *args)
+
+        relative_path = os.path.relpath(local_file, self._local_path)
+        priority = self._get_priority(relative_path)
+        group = relative_path.split(os.sep, 1)[0] if self._fair and os.sep in relative_path else None
+        order_key = self._get_order_key(local_file, local_file_size, mtime)
+
+        with self._lock:
+            self._sequence += 1
+            queue = self._queues.setdefault((priority, group), [])
+            heapq.heappush(queue, (order_key, self._sequence, fn, args))
+
+        return executor.submit(self._run_next)
+
+    def _get_priority(self, relative_path):
+        file_name = os.path.basename(relative_path)
+        for index, pattern in enumerate(self._priorities):
+            if fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(file_name, pattern):
+                return index
+        return len(self._priorities)
+
+    def _get_order_key(self, local_file, local_file_size, mtime):
+        if self._order == self.ORDER_SMALLEST:
+            return local_file_size
+        elif self._order == self.ORDER_LARGEST:
+            return -local_file_size
+        elif self._order == self.ORDER_NEWEST:
+            if mtime is None:
+                try:
+                    mtime = os.path.getmtime(local_file)
+                except OSError:
+                    mtime = 0
+            return -mtime
+        return 0
+
+    def _pop_next(self):
+        with self._lock:
+            priority = min(p for p, _ in self._queues)
+            queue_key = min((k for k in self._queues if k[0] == priority),
+                            key=lambda k: self._started.get(k[1], 0))
+            queue = self._queues[queue_key]
+            _, _, fn, args = heapq.heappop(queue)
+            if not queue:
+                del self._queues[queue_key]
+            self._started[queue_key[1]] = self._started.get(queue_key[1], 0) + 1
+            return fn, args
+
+    def _run_next(self):
+        fn, args = self._pop_next()
+        return fn(*args)
@@ -1,13 +1,21 @@
 import hashlib
 import os
+import re
+import time
 import pathlib
+from datetime import datetime
 
 
 class Utils:
     KB = 1024
     MB = KB * KB
+    GB = MB * KB
+    TB = GB * KB
     CHUNK_SIZE = 10 * MB
 
+    SIZE_UNITS = {'': 1, 'B': 1, 'K': KB, 'KB': KB, 'M': MB, 'MB': MB, 'G': GB, 'GB': GB, 'T': TB, 'TB': TB}
+    AGE_UNITS = {'S': 1, 'M': 60, 'H': 60 * 60, 'D': 24 * 60 * 60, 'W': 7 * 24 * 60 * 60}
+
     @staticmethod
     def app_dir():
         """Gets the application's primary directory for the current user.
@@ -55,3 +63,82 @@ class Utils:
                     break
                 md5.update(chunk)
         return md5.hexdigest()
+
+    @staticmethod
+    def read_range(local_path, offset, length):
+        """Reads a range of bytes from a file.
+
+        Args:
+            local_path: The path of the file to read.
+            offset: The position to start reading from.
+            length: The maximum number of bytes to read.
+
+        Returns:
+            The bytes read.
+        """
+        with open(local_path, mode='rb') as fd:
+            fd.seek(offset)
+            return fd.read(length)
+
+    @staticmethod
+    def parse_size(value):
+        """Parses a size in bytes with an optional unit (e.g., 512, 64K, 10MB, 1.5G).
+
+        Args:
+            value: The size to parse.
+
+        Returns:
+            The size in bytes.
+        """
+        match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*', str(value))
+        unit = match.group(2).upper() if match else None
+        if unit not in Utils.SIZE_UNITS:
+            raise ValueError('Invalid size: {0}'.format(value))
+        return int(float(match.group(1)) * Utils.SIZE_UNITS[unit])
+
+    @staticmethod
+    def parse_time(value):
+        """Parses a date/time (e.g., 2024-01-31 or 2024-01-31T12:00:00) or an age (e.g., 30m, 12h, 7d, 2w).
+
+        Args:
+            value: The date/time or age to parse.
+
+        Returns:
+            The timestamp. Ages are relative to now.
+        """
+        match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z])\s*', str(value))
+        if match and match.group(2).upper() in Utils.AGE_UNITS:
+            return time.time() - float(match.group(1)) * Utils.AGE_UNITS[match.group(2).upper()]
+
+        try:
+            return datetime.fromisoformat(str(value).strip()).timestamp()
+        except ValueError:
+            raise ValueError('Invalid time: {0}'.format(value))
+
+    @staticmethod
+    def read_paths(file_obj, null_separated=False):
+        """Reads paths from a newline or NUL separated stream.
+
+        Args:
+            file_obj: The text stream to read.
+            null_separated: True if the paths are separated by NUL characters.
+
+        Returns:
+            Generator of the non-empty paths.
+        """
+        if null_separated:
+            remainder = ''
+            while True:
+                chunk = file_obj.read(Utils.KB * 64)
+                if not chunk:
+                    break
+                paths = (remainder + chunk).split('\0')
+                remainder = paths.pop()
+                yield from filter(None, paths)
+            if remainder:
+                yield remainder
+        else:
+            for line in file_obj:
+                path = line.rstrip('\r\n')
+                if path:
+                    yield path
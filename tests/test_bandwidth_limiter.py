@@ -0,0 +1,101 @@
+import time
+import threading
+import pytest
+from datetime import datetime
+from synapse_uploader.bandwidth_limiter import BandwidthLimiter
+
+
+def test_enabled():
+    assert not BandwidthLimiter().enabled
+    assert BandwidthLimiter(rate=0).enabled
+    assert BandwidthLimiter(schedule=[(0, 60, 100)]).enabled
+    assert BandwidthLimiter(control_file='/tmp/bwlimit').enabled
+
+
+def test_acquire():
+    limiter = BandwidthLimiter(rate=100 * 1024)
+    start = time.monotonic()
+
+    def send():
+        for _ in range(5):
+            limiter.acquire(10 * 1024)
+
+    threads = [threading.Thread(target=send) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 200K at 100K/s across all the threads.
+    assert 1.8 <= time.monotonic() - start < 3
+
+
+def test_acquire_unlimited():
+    limiter = BandwidthLimiter()
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire(1024 * 1024 * 1024)
+    assert time.monotonic() - start < 0.5
+
+
+def test_schedule():
+    now = datetime.now()
+    minute = now.hour * 60 + now.minute
+
+    limiter = BandwidthLimiter(rate=100, schedule=[((minute + 60) % 1440, (minute + 120) % 1440, 200)])
+    assert limiter.get_rate() == 100
+
+    limiter = BandwidthLimiter(rate=100, schedule=[(minute, (minute + 2) % 1440, None),
+                                                   (minute, (minute + 2) % 1440, 200)])
+    assert limiter.get_rate() is None
+
+
+def test_control_file(tmp_path):
+    control_file = tmp_path / 'bwlimit'
+    limiter = BandwidthLimiter(rate=100, control_file=str(control_file))
+    assert limiter.get_rate() == 100
+
+    control_file.write_text('5K\n')
+    limiter._control_checked = None
+    assert limiter.get_rate() == 5 * 1024
+
+    control_file.write_text('unlimited')
+    limiter._control_checked = None
+    limiter._control_mtime = None
+    assert limiter.get_rate() is None
+
+    control_file.unlink()
+    limiter._control_checked = None
+    assert limiter.get_rate() == 100
+
+
+def test_parse_rate():
+    assert BandwidthLimiter.parse_rate('10M') == 10 * 1024 * 1024
+    assert BandwidthLimiter.parse_rate('0') == 0
+    assert BandwidthLimiter.parse_rate('unlimited') is None
+    assert BandwidthLimiter.parse_rate(' Off\n') is None
+    with pytest.raises(ValueError):
+        BandwidthLimiter.parse_rate('fast')
+
+
+def test_parse_window():
+    assert BandwidthLimiter.parse_window('08:00-18:30=5M') == (8 * 60, 18 * 60 + 30, 5 * 1024 * 1024)
+    assert BandwidthLimiter.parse_window('22:00-6:00=unlimited') == (22 * 60, 6 * 60, None)
+    for value in ['08:00=5M', '08:00-18:00', '25:00-26:00=1M', '08:60-09:00=1M']:
+        with pytest.raises(ValueError):
+            BandwidthLimiter.parse_window(value)
+
+
+def test_in_window():
+    assert BandwidthLimiter._in_window(9 * 60, 8 * 60, 18 * 60)
+    assert not BandwidthLimiter._in_window(18 * 60, 8 * 60, 18 * 60)
+    assert BandwidthLimiter._in_window(23 * 60, 22 * 60, 6 * 60)
+    assert BandwidthLimiter._in_window(5 * 60, 22 * 60, 6 * 60)
+    assert not BandwidthLimiter._in_window(12 * 60, 22 * 60, 6 * 60)
+
+
+def test_format_rate():
+    assert BandwidthLimiter.format_rate(None) == 'unlimited'
+    assert BandwidthLimiter.format_rate(0) == 'paused'
+    assert BandwidthLimiter.format_rate(512) == '512 B/s'
+    assert BandwidthLimiter.format_rate(10 * 1024 * 1024) == '10.0 MB/s'
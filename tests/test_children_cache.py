@@ -0,0 +1,122 @@
+import time
+import threading
+import pytest
+from synapse_uploader.children_cache import ChildrenCache
+
+
+def list_children(parent_id, count=3):
+    for i in range(count):
+        yield {'name': 'file{0}.txt'.format(i), 'id': '{0}{1}'.format(parent_id, i), 'type': 'file'}
+
+
+def test_get():
+    calls = []
+
+    def list_fn(parent_id):
+        calls.append(parent_id)
+        return list_children(parent_id)
+
+    cache = ChildrenCache(list_fn)
+    children = cache.get('syn1')
+    assert children == {'file0.txt': 'syn10', 'file1.txt': 'syn11', 'file2.txt': 'syn12'}
+    assert cache.get('syn1') is children
+    assert calls == ['syn1']
+    assert 'syn1' in cache
+    assert cache.size > 0
+
+
+def test_get_single_flight():
+    calls = []
+    started = threading.Event()
+
+    def list_fn(parent_id):
+        calls.append(parent_id)
+        started.set()
+        time.sleep(0.1)
+        return list_children(parent_id)
+
+    cache = ChildrenCache(list_fn)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('syn1'))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['syn1']
+    assert len(results) == 5
+    assert all(r is results[0] for r in results)
+
+
+def test_get_error():
+    calls = []
+
+    def list_fn(parent_id):
+        calls.append(parent_id)
+        if len(calls) == 1:
+            raise Exception('Listing failed')
+        return list_children(parent_id)
+
+    cache = ChildrenCache(list_fn)
+    with pytest.raises(Exception, match='Listing failed'):
+        cache.get('syn1')
+    assert 'syn1' not in cache
+
+    # The next get lists again.
+    assert len(cache.get('syn1')) == 3
+    assert calls == ['syn1', 'syn1']
+
+
+def test_memory_budget():
+    cache = ChildrenCache(lambda parent_id: list_children(parent_id, count=10))
+    cache.get('syn1')
+    listing_size = cache.size
+
+    cache = ChildrenCache(lambda parent_id: list_children(parent_id, count=10), max_bytes=listing_size * 2)
+    cache.get('syn1')
+    cache.get('syn2')
+    cache.get('syn1')
+    cache.get('syn3')
+
+    # The least recently used listing is evicted.
+    assert 'syn1' in cache
+    assert 'syn2' not in cache
+    assert 'syn3' in cache
+    assert cache.size <= cache.max_bytes
+
+    # Listings over the budget are not cached.
+    cache = ChildrenCache(lambda parent_id: list_children(parent_id, count=10), max_bytes=listing_size - 1)
+    assert len(cache.get('syn1')) == 10
+    assert 'syn1' not in cache
+    assert cache.size == 0
+
+
+def test_get_folders():
+    def list_fn(parent_id):
+        yield {'name': 'file0.txt', 'id': 'syn2', 'type': 'org.sagebionetworks.repo.model.FileEntity'}
+        yield {'name': 'folder0', 'id': 'syn3', 'type': ChildrenCache.FOLDER_TYPE}
+
+    cache = ChildrenCache(list_fn)
+    assert cache.get('syn1') == {'file0.txt': 'syn2'}
+    assert cache.get_folders('syn1') == {'folder0': 'syn3'}
+
+
+def test_set_empty():
+    calls = []
+
+    def list_fn(parent_id):
+        calls.append(parent_id)
+        return list_children(parent_id)
+
+    cache = ChildrenCache(list_fn)
+    cache.set_empty('syn1')
+    assert cache.get('syn1') == {}
+    assert cache.get_folders('syn1') == {}
+
+    # Listings that are already cached are kept.
+    cache.get('syn2')
+    cache.set_empty('syn2')
+    assert len(cache.get('syn2')) == 3
+    assert calls == ['syn2']
@@ -1,11 +1,22 @@
 import pytest
+from datetime import datetime
 import synapse_uploader.cli as cli
 from synapse_uploader.synapse_uploader import SynapseUploader
 
 
-def test_cli(mocker, test_synapse_auth_token):
-    args = ['', 'syn123', '/tmp', '-r', '10', '-d', '20', '-t', '30',
-            '--auth-token', test_synapse_auth_token, '-ll', 'debug', '-f', '-cd', '/tmp/cache']
+def test_cli(mocker, test_synapse_auth_token, tmp_path):
+    exclude_from = tmp_path / '.uploadignore'
+    exclude_from.write_text('# Comment\n__pycache__/\n')
+
+    args = ['', 'syn123', '/tmp', '-r', '10', '-d', '20', '-t', '30', '--max-connections', '40',
+            '--auth-token', test_synapse_auth_token, '-ll', 'debug', '-f', '-cd', '/tmp/cache',
+            '-m', '--trash', '--pack-threshold', '64K', '--pack-size', '1M',
+            '--files-from', '-', '-0', '--profile', '--profile-stacks',
+            '--order', 'smallest', '--priority', '*.json', '--priority', 'results/*', '--fair',
+            '--exclude-from', str(exclude_from), '--exclude', '*.tmp', '--include', '*.bam',
+            '--min-size', '1K', '--max-size', '10G', '--newer-than', '2024-01-31', '--older-than', '2024-02-29',
+            '--bwlimit', '10M', '--bwlimit-window', '08:00-18:00=5M', '--bwlimit-window', '22:00-06:00=unlimited',
+            '--bwlimit-file', '/tmp/bwlimit', '--manifest', '/tmp/manifest.txt', '--manifest-format', 'csv']
     mocker.patch('sys.argv', args)
     mocker.patch('src.synapse_uploader.synapse_uploader.SynapseUploader.execute')
     mock_init = mocker.spy(SynapseUploader, '__init__')
@@ -13,11 +24,38 @@ def test_cli(mocker, test_synapse_auth_token):
     with pytest.raises(SystemExit):
         cli.main()
 
+    _, kwargs = mock_init.call_args
+    assert kwargs['profile_path'].endswith('.profile.txt')
+    assert kwargs['profile_stacks_path'].endswith('.stacks.txt')
+
     mock_init.assert_called_once_with(mocker.ANY,
                                       'syn123',
                                       '/tmp',
                                       remote_path='10',
                                       max_depth=20,
                                       max_threads=30,
-                                      force_upload=True
+                                      force_upload=True,
+                                      mirror=True,
+                                      trash=True,
+                                      pack_threshold=64 * 1024,
+                                      pack_size=1024 * 1024,
+                                      files_from='-',
+                                      null_separated=True,
+                                      max_connections=40,
+                                      profile_path=mocker.ANY,
+                                      profile_stacks_path=mocker.ANY,
+                                      order='smallest',
+                                      priorities=['*.json', 'results/*'],
+                                      fair=True,
+                                      excludes=['# Comment', '__pycache__/', '*.tmp'],
+                                      includes=['*.bam'],
+                                      min_size=1024,
+                                      max_size=10 * 1024 * 1024 * 1024,
+                                      newer_than=datetime(2024, 1, 31).timestamp(),
+                                      older_than=datetime(2024, 2, 29).timestamp(),
+                                      bandwidth_limit=10 * 1024 * 1024,
+                                      bandwidth_schedule=[(8 * 60, 18 * 60, 5 * 1024 * 1024), (22 * 60, 6 * 60, None)],
+                                      bandwidth_control_file='/tmp/bwlimit',
+                                      manifest_path='/tmp/manifest.txt',
+                                      manifest_format='csv'
                                       )
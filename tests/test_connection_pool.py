@@ -0,0 +1,43 @@
+import threading
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synapse_uploader.connection_pool import ConnectionPool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_pool(http_server_url):
+    connection_pool = ConnectionPool(max_size=4)
+    session = connection_pool.mount()
+
+    for _ in range(5):
+        assert session.get(http_server_url).text == 'ok'
+
+    assert connection_pool.get_stats() == {'requests': 5, 'connections': 1, 'reused': 4}
+
+    # Stats are kept for closed sessions.
+    session.close()
+    other_session = connection_pool.mount()
+    other_session.get(http_server_url)
+    assert connection_pool.get_stats() == {'requests': 6, 'connections': 2, 'reused': 4}
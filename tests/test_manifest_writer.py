@@ -0,0 +1,78 @@
+import csv
+import json
+import threading
+import pytest
+from synapse_uploader.manifest_writer import ManifestWriter
+
+
+def test_format():
+    assert ManifestWriter('/tmp/manifest.jsonl').format == 'jsonl'
+    assert ManifestWriter('/tmp/manifest.CSV').format == 'csv'
+    assert ManifestWriter('/tmp/manifest.txt', format='csv').format == 'csv'
+    with pytest.raises(ValueError):
+        ManifestWriter('/tmp/manifest.txt', format='parquet')
+
+
+def test_write_jsonl(tmp_path):
+    path = str(tmp_path / 'manifest.jsonl')
+    manifest = ManifestWriter(path, queue_size=10)
+    manifest.open()
+
+    def write(thread_number):
+        for i in range(100):
+            manifest.write({'local_path': '/data/{0}/{1}'.format(thread_number, i), 'size': i, 'status': 'uploaded'})
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manifest.close()
+
+    with open(path) as fd:
+        records = [json.loads(line) for line in fd]
+    assert manifest.count == 400
+    assert len(records) == 400
+    assert len(set(r['local_path'] for r in records)) == 400
+    assert list(records[0].keys()) == ManifestWriter.FIELDS
+    assert records[0]['synapse_id'] is None
+
+
+def test_write_csv(tmp_path):
+    path = str(tmp_path / 'manifest.csv')
+    manifest = ManifestWriter(path)
+    manifest.open()
+    manifest.write({'local_path': '/data/a,b.txt', 'size': 1, 'synapse_id': 'syn1', 'version': 2, 'status': 'uploaded'})
+    manifest.write({'local_path': '/data/c.txt', 'size': 0, 'status': 'skipped'})
+    manifest.close()
+
+    with open(path, newline='') as fd:
+        rows = list(csv.DictReader(fd))
+    assert [r['local_path'] for r in rows] == ['/data/a,b.txt', '/data/c.txt']
+    assert rows[0]['synapse_id'] == 'syn1'
+    assert rows[0]['version'] == '2'
+    assert rows[1]['synapse_id'] == ''
+    assert list(rows[0].keys()) == ManifestWriter.FIELDS
+
+
+def test_close_without_records(tmp_path):
+    path = tmp_path / 'manifest.jsonl'
+    manifest = ManifestWriter(str(path))
+    manifest.open()
+    manifest.close()
+    assert path.read_text() == ''
+    # Closing again does nothing.
+    manifest.close()
+
+
+def test_write_failed(tmp_path):
+    manifest = ManifestWriter(str(tmp_path / 'manifest.jsonl'))
+    manifest.open()
+    manifest.write({'local_path': '/data/a.txt', 'size': object()})
+    # Records after a failure are dropped without blocking.
+    manifest.write({'local_path': '/data/b.txt', 'size': 1})
+    manifest.close()
+
+    assert manifest.failed
+    assert isinstance(manifest.error, TypeError)
+    assert manifest.count == 0
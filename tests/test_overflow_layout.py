@@ -0,0 +1,109 @@
+from synapse_uploader.overflow_layout import OverflowLayout
+
+
+def get_children(names, bucket_paths, existing=None):
+    """Gets the children of each container for the names placed in their overflow folders."""
+    children = {}
+    for name, bucket_path in list(zip(names, bucket_paths)) + list((existing or {}).items()):
+        full_path = bucket_path + (name,)
+        for level in range(len(full_path)):
+            children.setdefault(full_path[:level], set()).add(full_path[level])
+    return children
+
+
+def test_place():
+    names = ['file{0}'.format(i) for i in range(100)]
+
+    # No overflow folders when the names fit.
+    assert OverflowLayout(100).place(names) == [()] * 100
+
+    for max_depth in [2, 3, 10, 99]:
+        bucket_paths = OverflowLayout(max_depth).place(names)
+        assert len(bucket_paths) == len(names)
+
+        # Every container has at most max_depth children.
+        assert max(len(c) for c in get_children(names, bucket_paths).values()) <= max_depth
+
+        # Assignments are stable.
+        assert OverflowLayout(max_depth).place(names) == bucket_paths
+
+
+def test_place_growth():
+    names = ['file{0}'.format(i) for i in range(100)]
+    # Enough names to double the number of overflow folders.
+    new_names = ['new-file{0}'.format(i) for i in range(200)]
+
+    for max_depth in [10, 99]:
+        bucket_paths = OverflowLayout(max_depth).place(names)
+        existing = dict(zip(names, bucket_paths))
+        assert len(set(bucket_paths)) < len(set(OverflowLayout(max_depth).place(names + new_names)))
+
+        # The existing names keep their overflow folder, including ones that were removed locally.
+        grown_paths = OverflowLayout(max_depth, existing).place(names[10:] + new_names)
+        assert grown_paths[:90] == bucket_paths[10:]
+        assert max(len(c) for c in get_children(names[10:] + new_names, grown_paths, existing).values()) <= max_depth
+
+    # Existing overflow folders are kept when the names fit in one container again.
+    bucket_paths = OverflowLayout(10).place(names)
+    existing = dict(zip(names, bucket_paths))
+    assert OverflowLayout(10, existing).place(names[:5]) == bucket_paths[:5]
+
+    # New names go in the existing overflow folders.
+    assert all(OverflowLayout(10, existing).place(names[:5] + ['new-file'])[5])
+
+    # Folders that are not valid overflow folders for max_depth are ignored.
+    assert OverflowLayout(10, {'file0': ('more_0011',)}).place(names[:5]) == [()] * 5
+
+
+def test_place_direct():
+    names = ['file{0}'.format(i) for i in range(10)]
+    existing = {name: () for name in names[:6]}
+
+    # Names directly in the container stay there when the directory grows.
+    bucket_paths = OverflowLayout(10, existing).place(names + ['new-file{0}'.format(i) for i in range(10)])
+    assert bucket_paths[:6] == [()] * 6
+    assert all(bucket_paths[6:])
+    assert max(len(c) for c in get_children(names + ['new-file{0}'.format(i) for i in range(10)],
+                                            bucket_paths).values()) <= 10
+
+    # New names cannot be placed when the container is full.
+    existing = {name: () for name in names}
+    assert OverflowLayout(10, existing).place(names + ['new-file']) == [()] * 10 + [None]
+
+
+def test_place_legacy():
+    # The layout made by earlier versions: max_depth - 1 names in each level and a "more" folder.
+    names = ['file{0}'.format(i) for i in range(7)]
+    existing = {'file0': (), 'file1': (), 'file2': ('more',), 'file3': ('more',), 'file4': ('more', 'more')}
+
+    # Existing names keep their place and new names are added to the chain.
+    assert OverflowLayout(3, existing).place(names) == [
+        (), (), ('more',), ('more',), ('more', 'more'), ('more', 'more'), ('more', 'more', 'more')
+    ]
+
+    # New names fill the levels that have room first.
+    del existing['file3']
+    assert OverflowLayout(3, existing).place(['file2', 'new-file']) == [('more',), ('more',)]
+
+    # An empty "more" folder is still a chain.
+    assert OverflowLayout(3, {'file0': ()}, {('more',)}).place(['file0', 'file1', 'file2']) == [
+        (), (), ('more',)
+    ]
+
+
+def test_place_batches():
+    names = ['file{0}'.format(i) for i in range(30)]
+    overflow_layout = OverflowLayout(10)
+
+    # Names placed in batches are added to the layout, batches that do not fit go in overflow folders.
+    bucket_paths = overflow_layout.place(names[:9])
+    assert bucket_paths == [()] * 9
+    bucket_paths += overflow_layout.place(names[9:])
+    assert all(bucket_paths[9:])
+    assert overflow_layout.place(names[:1]) == [()]
+    assert max(len(c) for c in get_children(names, bucket_paths).values()) <= 10
+
+    # A batch that fills the container leaves no room for overflow folders.
+    overflow_layout = OverflowLayout(10)
+    assert overflow_layout.place(names[:10]) == [()] * 10
+    assert overflow_layout.place(names[10:11]) == [None]
@@ -0,0 +1,47 @@
+import os
+import io
+import hashlib
+import tarfile
+from synapse_uploader.packed_archive import PackedArchive
+
+
+def mkfile(*path_segments, content):
+    path = os.path.join(*path_segments)
+    with open(path, 'wb') as file:
+        file.write(content)
+    return path
+
+
+def test_packed_archive(new_temp_dir):
+    contents = {
+        'file1': b'1',
+        'file2': os.urandom(1000),
+        'file3': os.urandom(512),
+        'file-with-a-very-long-name-{0}'.format('x' * 120): b'long name'
+    }
+    local_files = []
+    for name, content in contents.items():
+        local_file = mkfile(new_temp_dir, name, content=content)
+        local_files.append((local_file, os.stat(local_file)))
+
+    archive = PackedArchive(os.path.join(new_temp_dir, 'packed-files-0001.tar'), local_files)
+    assert archive.name == 'packed-files-0001.tar'
+
+    data = archive.read(0, archive.size)
+    assert len(data) == archive.size
+    assert archive.size % tarfile.RECORDSIZE == 0
+    assert archive.get_md5() == hashlib.md5(data).hexdigest()
+
+    # Reading in parts gives the same bytes.
+    part_size = 100
+    parts = [archive.read(offset, part_size) for offset in range(0, archive.size, part_size)]
+    assert b''.join(parts) == data
+
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == [PackedArchive.MANIFEST_NAME] + list(contents.keys())
+        for name, content in contents.items():
+            assert tar.extractfile(name).read() == content
+
+        manifest = tar.extractfile(PackedArchive.MANIFEST_NAME).read().decode('utf-8').splitlines()
+        assert manifest[0] == 'name\tsize\tmtime'
+        assert [line.split('\t')[0] for line in manifest[1:]] == list(contents.keys())
@@ -0,0 +1,108 @@
+import os
+import pytest
+from synapse_uploader.path_filter import PathFilter
+
+
+def test_is_empty():
+    assert PathFilter().is_empty
+    assert PathFilter(excludes=['', '# Comment']).is_empty
+    assert not PathFilter(excludes=['*.tmp']).is_empty
+    assert not PathFilter(includes=['*.bam']).is_empty
+    assert not PathFilter(min_size=1).is_empty
+    assert PathFilter(min_size=1).needs_stat
+    assert not PathFilter(excludes=['*.tmp']).needs_stat
+
+
+@pytest.mark.parametrize('pattern,path,is_dir,excluded', [
+    ('*.tmp', 'file.tmp', False, True),
+    ('*.tmp', 'a/b/file.tmp', False, True),
+    ('*.tmp', 'file.txt', False, False),
+    ('file?.txt', 'a/file1.txt', False, True),
+    ('file[0-9].txt', 'file1.txt', False, True),
+    ('file[!0-9].txt', 'file1.txt', False, False),
+    ('__pycache__/', 'a/__pycache__', True, True),
+    ('__pycache__/', 'a/__pycache__', False, False),
+    ('/build', 'build', True, True),
+    ('/build', 'a/build', True, False),
+    ('a/*.txt', 'a/file.txt', False, True),
+    ('a/*.txt', 'a/b/file.txt', False, False),
+    ('a/**/*.txt', 'a/file.txt', False, True),
+    ('a/**/*.txt', 'a/b/c/file.txt', False, True),
+    ('**/scratch', 'a/b/scratch', True, True),
+    ('logs/**', 'logs/a/b.log', False, True),
+    ('file.txt', 'file_txt', False, False),
+])
+def test_exclude_patterns(pattern, path, is_dir, excluded):
+    path_filter = PathFilter(excludes=[pattern])
+    if is_dir:
+        assert path_filter.is_dir_excluded(path) == excluded
+    else:
+        assert path_filter.is_file_excluded(path) == excluded
+
+
+def test_negated_patterns():
+    path_filter = PathFilter(excludes=['*.log', '!keep.log'])
+    assert path_filter.is_file_excluded('a/debug.log')
+    assert not path_filter.is_file_excluded('a/keep.log')
+
+    # The last matching pattern wins.
+    path_filter = PathFilter(excludes=['!keep.log', '*.log'])
+    assert path_filter.is_file_excluded('a/keep.log')
+
+
+def test_include_patterns():
+    path_filter = PathFilter(includes=['*.bam', 'meta/*.json'])
+    assert not path_filter.is_file_excluded('a/sample.bam')
+    assert not path_filter.is_file_excluded('meta/study.json')
+    assert path_filter.is_file_excluded('other/study.json')
+    assert path_filter.is_file_excluded('a/sample.txt')
+    # Directories are descended into to find included files.
+    assert not path_filter.is_dir_excluded('a')
+
+
+def test_include_dir_patterns():
+    path_filter = PathFilter(includes=['results/', '/data/raw/', '!results/tmp/'])
+    # Files under an included directory are included.
+    assert not path_filter.is_file_excluded('results/table.csv')
+    assert not path_filter.is_file_excluded('a/results/b/table.csv')
+    assert not path_filter.is_file_excluded('data/raw/reads.fq')
+    assert path_filter.is_file_excluded('data/raw2/reads.fq')
+    assert path_filter.is_file_excluded('table.csv')
+    # A file named like the directory is not.
+    assert path_filter.is_file_excluded('a/results')
+    # The nearest matching directory wins.
+    assert path_filter.is_file_excluded('results/tmp/table.csv')
+
+
+def test_stat_filters():
+    path_filter = PathFilter(min_size=10, max_size=100, newer_than=1000, older_than=2000)
+
+    def stat(size, mtime):
+        return os.stat_result((0o644, 0, 0, 1, 0, 0, size, mtime, mtime, mtime))
+
+    assert not path_filter.is_file_excluded('file', stat(10, 1000))
+    assert not path_filter.is_file_excluded('file', stat(100, 1999))
+    assert path_filter.is_file_excluded('file', stat(9, 1500))
+    assert path_filter.is_file_excluded('file', stat(101, 1500))
+    assert path_filter.is_file_excluded('file', stat(50, 999))
+    assert path_filter.is_file_excluded('file', stat(50, 2000))
+    # Only the patterns are checked without a stat.
+    assert not path_filter.is_file_excluded('file')
+
+
+def test_is_path_excluded():
+    path_filter = PathFilter(excludes=['.snakemake/', 'scratch'])
+    assert path_filter.is_path_excluded('a/.snakemake/log/file.txt')
+    assert path_filter.is_path_excluded('scratch/file.txt')
+    assert not path_filter.is_path_excluded('a/b/file.txt')
+
+
+def test_read_patterns(tmp_path):
+    path = tmp_path / '.uploadignore'
+    path.write_text('# Comment\n\n*.tmp\r\n!keep.tmp\n')
+    patterns = PathFilter.read_patterns(str(path))
+    assert patterns == ['# Comment', '', '*.tmp', '!keep.tmp']
+
+    path_filter = PathFilter(excludes=patterns)
+    assert path_filter.is_file_excluded('file.tmp')
+    assert not path_filter.is_file_excluded('keep.tmp')
@@ -0,0 +1,69 @@
+import time
+import threading
+from synapse_uploader.profiler import Profiler
+
+
+def test_stage():
+    profiler = Profiler()
+
+    def work():
+        with profiler.stage('upload'):
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=work) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with profiler.stage('hash'):
+        time.sleep(0.02)
+
+    profiler.stop()
+    upload = profiler._stats['upload']
+    hash = profiler._stats['hash']
+    assert upload['calls'] == 2
+    assert hash['calls'] == 1
+
+    # Overlapping threads count once in wall time and twice in thread time.
+    assert 0.05 <= upload['wall'] < upload['thread']
+    assert upload['thread'] >= 0.1
+    assert upload['critical'] <= upload['wall']
+    assert hash['critical'] >= 0.02
+
+    report = profiler.get_report()
+    assert report.splitlines()[0].startswith('Stage')
+    assert 'upload' in report
+    assert 'hash' in report
+    assert 'Run time' in report
+
+
+def test_stage_disabled():
+    profiler = Profiler(enabled=False)
+    with profiler.stage('upload'):
+        pass
+    assert 'upload' not in profiler.get_report()
+
+
+def test_write_report_and_stacks(tmp_path):
+    profiler = Profiler()
+    profiler.start_sampling(interval=0.001)
+
+    with profiler.stage('scan'):
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+
+    profiler.stop()
+
+    report_path = tmp_path / 'profile.txt'
+    stacks_path = tmp_path / 'stacks.txt'
+    profiler.write_report(str(report_path))
+    profiler.write_stacks(str(stacks_path))
+
+    assert 'scan' in report_path.read_text()
+    lines = stacks_path.read_text().splitlines()
+    assert len(lines) > 0
+    stack, count = lines[0].rsplit(' ', 1)
+    assert 'test_write_report_and_stacks' in stack
+    assert int(count) > 0
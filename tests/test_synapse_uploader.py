@@ -1,7 +1,18 @@
 import pytest
 import os
 import uuid
+import json
+import hashlib
+import synapseclient as syn
+from synapseclient.core.constants import concrete_types
+from synapsis import Synapsis
 from synapse_uploader.synapse_uploader import SynapseUploader
+from synapse_uploader.upload_scheduler import UploadScheduler
+from synapse_uploader.upload_body import UploadBody
+from synapse_uploader.overflow_layout import OverflowLayout
+from synapse_uploader.manifest_writer import ManifestWriter
+from synapse_uploader.path_filter import PathFilter
+from synapse_uploader.utils import Utils
 
 
 def mkdir(*path_segments):
@@ -78,12 +89,99 @@ def test_min_depth_value():
     assert 'Maximum depth must be greater than or equal to 2.' in errors
 
 
+def test_max_connections_value():
+    syn_uploader = SynapseUploader('None', 'None', max_connections=5)
+    assert syn_uploader._max_connections == 5
+
+    syn_uploader = SynapseUploader('None', 'None', max_threads=3)
+    assert syn_uploader._get_thread_count() == 3
+
+
 def test_force_upload_value():
     for b_value in [True, False]:
         syn_uploader = SynapseUploader('None', 'None', force_upload=b_value)
         assert syn_uploader._force_upload == b_value
 
 
+def test_pack_values():
+    syn_uploader = SynapseUploader('None', 'None', pack_threshold=10, pack_size=100)
+    assert syn_uploader._pack_threshold == 10
+    assert syn_uploader._pack_size == 100
+
+    errors = SynapseUploader('None', 'None', pack_threshold=100, pack_size=10).execute().errors
+    assert 'Pack size must be greater than or equal to the pack threshold.' in errors
+
+
+def test_files_from_value():
+    syn_uploader = SynapseUploader('None', 'None', files_from='-', null_separated=True)
+    assert syn_uploader._files_from == '-'
+    assert syn_uploader._null_separated is True
+
+    errors = SynapseUploader('None', 'None', files_from='-', mirror=True).execute().errors
+    assert 'Cannot mirror a list of files.' in errors
+
+    errors = SynapseUploader('None', 'None', files_from='missing-files-from').execute().errors
+    assert 'Files from not found: missing-files-from' in errors
+
+
+def test_order_values():
+    syn_uploader = SynapseUploader('None', 'None', order='largest', priorities=['*.json'], fair=True)
+    assert syn_uploader._order == 'largest'
+    assert syn_uploader._priorities == ['*.json']
+    assert syn_uploader._fair is True
+
+    errors = SynapseUploader('None', 'None', order='random').execute().errors
+    assert 'Order must be one of: name, smallest, largest, newest.' in errors
+
+
+def test_filter_values():
+    syn_uploader = SynapseUploader('None', 'None', excludes=['*.tmp'], includes=['*.bam'], min_size=1, max_size=2,
+                                   newer_than=3, older_than=4)
+    assert syn_uploader._excludes == ['*.tmp']
+    assert syn_uploader._includes == ['*.bam']
+    assert syn_uploader._min_size == 1
+    assert syn_uploader._max_size == 2
+    assert syn_uploader._newer_than == 3
+    assert syn_uploader._older_than == 4
+
+    errors = SynapseUploader('None', 'None', min_size=2, max_size=1).execute().errors
+    assert 'Minimum size must be less than or equal to the maximum size.' in errors
+
+    errors = SynapseUploader('None', 'None', excludes=['[z-a]']).execute().errors
+    assert any(e.startswith('Invalid include or exclude pattern:') for e in errors)
+
+
+def test_bandwidth_values():
+    syn_uploader = SynapseUploader('None', 'None')
+    assert not syn_uploader._bandwidth_limiter.enabled
+
+    syn_uploader = SynapseUploader('None', 'None', bandwidth_limit=100)
+    assert syn_uploader._bandwidth_limiter.enabled
+    assert syn_uploader._bandwidth_limiter.get_rate() == 100
+
+
+def test_manifest_values():
+    syn_uploader = SynapseUploader('None', 'None')
+    assert syn_uploader._manifest is None
+
+    syn_uploader = SynapseUploader('None', 'None', manifest_path='/tmp/manifest.csv')
+    assert syn_uploader._manifest.path == '/tmp/manifest.csv'
+    assert syn_uploader._manifest.format == 'csv'
+
+    syn_uploader = SynapseUploader('None', 'None', manifest_path='/tmp/manifest.txt', manifest_format='jsonl')
+    assert syn_uploader._manifest.format == 'jsonl'
+
+
+def test_mirror_value():
+    for b_value in [True, False]:
+        syn_uploader = SynapseUploader('None', 'None', mirror=b_value, trash=b_value)
+        assert syn_uploader._mirror == b_value
+        assert syn_uploader._trash == b_value
+
+    errors = SynapseUploader('None', 'None', trash=True).execute().errors
+    assert 'Trash can only be used when mirroring.' in errors
+
+
 def test_upload_remote_path(syn_client, new_syn_project, new_temp_dir):
     """
             Tests this scenario:
@@ -259,6 +357,73 @@ def test_force_upload(syn_client, synapse_test_helper, new_syn_project, new_temp
     assert syn_file.annotations == annotations
 
 
+def test_get_overflow_layout(mocker, new_temp_dir):
+    folder_type = 'org.sagebionetworks.repo.model.Folder'
+    file_type = 'org.sagebionetworks.repo.model.FileEntity'
+    children = {
+        'syn1': [{'name': 'more_0001', 'id': 'syn2', 'type': folder_type},
+                 {'name': 'folder1', 'id': 'syn3', 'type': folder_type},
+                 {'name': 'more_0003', 'id': 'syn8', 'type': folder_type},
+                 {'name': 'file0', 'id': 'syn9', 'type': file_type}],
+        'syn2': [{'name': 'more_0002', 'id': 'syn4', 'type': folder_type},
+                 {'name': 'file1', 'id': 'syn5', 'type': file_type}],
+        'syn4': [{'name': 'file2', 'id': 'syn6', 'type': file_type},
+                 {'name': 'folder2', 'id': 'syn7', 'type': folder_type}]
+    }
+    mock_list = mocker.patch.object(SynapseUploader, '_list_synapse_children',
+                                    side_effect=lambda parent_id: iter(children[parent_id]))
+    mocker.patch.object(SynapseUploader, '_retry_sleep')
+
+    mkdir(new_temp_dir, 'more_0003')
+
+    syn_uploader = SynapseUploader('syn1', new_temp_dir, max_depth=10)
+    # more_0003 is a local directory, not an overflow folder.
+    overflow_layout = syn_uploader._get_overflow_layout({'id': 'syn1'}, new_temp_dir)
+    assert overflow_layout._existing == {
+        'file0': (),
+        'folder1': (),
+        'more_0003': (),
+        'file1': ('more_0001',),
+        'file2': ('more_0001', 'more_0002'),
+        'folder2': ('more_0001', 'more_0002')
+    }
+    assert overflow_layout._overflow_folders == {('more_0001',), ('more_0001', 'more_0002')}
+    assert [c.args[0] for c in mock_list.call_args_list] == ['syn1', 'syn2', 'syn4']
+
+    # The listings are shared with joining the files.
+    assert list(syn_uploader._join_synapse_files([('file2', 3)], {'id': 'syn4'})) == [('file2', 3,
+                                                                                      {'name': 'file2', 'id': 'syn6'})]
+    assert mock_list.call_count == 3
+    assert not syn_uploader.errors
+
+    mock_list.side_effect = Exception('Listing failed')
+    assert syn_uploader._get_overflow_layout({'id': 'syn10'}, new_temp_dir) is None
+    assert syn_uploader.errors == ['Cannot get overflow folders in: syn10 : Listing failed']
+
+
+def test_upload_folder_overflow_kept(mocker, new_temp_dir):
+    syn_project = syn.Project(name='Project', id='syn1')
+    file1 = mkfile(new_temp_dir, 'file1', content='abc')
+    file2 = mkfile(new_temp_dir, 'file2', content='abc')
+    children = {
+        'syn1': [{'name': 'more_0001', 'id': 'syn2', 'type': 'org.sagebionetworks.repo.model.Folder'}],
+        'syn2': [{'name': 'file1', 'id': 'syn3', 'type': 'org.sagebionetworks.repo.model.FileEntity'}]
+    }
+    mocker.patch.object(SynapseUploader, '_list_synapse_children', side_effect=lambda parent_id: children[parent_id])
+    mock_store = mocker.patch.object(Synapsis.Synapse, 'store')
+    mock_submit_files = mocker.patch.object(SynapseUploader, '_submit_files')
+
+    # The directory fits in one container but is already spread over an overflow folder.
+    syn_uploader = SynapseUploader(syn_project.id, new_temp_dir, max_depth=10)
+    syn_uploader._upload_folder(None, new_temp_dir, syn_project)
+
+    assert mock_submit_files.call_count == 2
+    (_, parent_files, synapse_parent), _ = mock_submit_files.call_args_list[1]
+    assert parent_files == [(file1, 3), (file2, 3)]
+    assert synapse_parent.id == 'syn2'
+    assert mock_store.call_count == 0
+    assert not syn_uploader.errors
+
 def test_upload_max_depth(syn_client, new_syn_project, new_temp_dir):
     """
         Tests this scenario:
@@ -276,24 +441,7 @@ def test_upload_max_depth(syn_client, new_syn_project, new_temp_dir):
         folder4
         folder5
 
-        TO:
-
-        file1
-        file2
-        more/
-            file3
-            file4
-            more/
-                file5
-                folder1/
-                    file1-1
-                    file1-2
-                more/
-                    folder2
-                    folder3
-                    more/
-                        folder4
-                        folder5
+        TO the files and folders spread over nested more_NNNN folders with at most 3 children each.
         """
     for i in range(1, 6):
         mkfile(new_temp_dir, 'file{0}'.format(i))
@@ -304,54 +452,597 @@ def test_upload_max_depth(syn_client, new_syn_project, new_temp_dir):
 
     SynapseUploader(new_syn_project.id, new_temp_dir, max_depth=3).execute()
 
+    file_names = ['file{0}'.format(i) for i in range(1, 6)]
+    folder_names = ['folder{0}'.format(i) for i in range(1, 6)]
+    bucket_paths = OverflowLayout(3).place(file_names + folder_names)
+
+    syn_containers = {(): new_syn_project}
+    for name, bucket_path in zip(file_names + folder_names, bucket_paths):
+        for level in range(1, len(bucket_path) + 1):
+            if bucket_path[:level] not in syn_containers:
+                syn_folders, _ = get_syn_folders(syn_client, syn_containers[bucket_path[:level - 1]])
+                syn_containers[bucket_path[:level]] = find_by_name(syn_folders, bucket_path[level - 1])
+                assert syn_containers[bucket_path[:level]]
+
+        syn_parent = syn_containers[bucket_path]
+        if name in file_names:
+            syn_files, _ = get_syn_files(syn_client, syn_parent)
+            assert find_by_name(syn_files, name)
+        else:
+            syn_folders, _ = get_syn_folders(syn_client, syn_parent)
+            assert find_by_name(syn_folders, name)
+
+    for syn_container in syn_containers.values():
+        syn_files, _ = get_syn_files(syn_client, syn_container)
+        syn_folders, _ = get_syn_folders(syn_client, syn_container)
+        assert len(syn_files) + len(syn_folders) <= 3
+
+    folder1_bucket_path = bucket_paths[len(file_names) + folder_names.index('folder1')]
+    syn_folders, _ = get_syn_folders(syn_client, syn_containers[folder1_bucket_path])
+    syn_folder1 = find_by_name(syn_folders, 'folder1')
+    child_syn_files, child_syn_file_names = get_syn_files(syn_client, syn_folder1)
+    assert child_syn_file_names == ['file1-1', 'file1-2']
+
+
+def test_mirror(syn_client, new_syn_project, new_temp_dir):
+    """
+        Tests this scenario:
+
+        file1
+        file2
+        folder1/
+            file3
+
+        TO:
+
+        file1-renamed
+        folder2/
+            file3
+        """
+    file1 = mkfile(new_temp_dir, 'file1', content='file1')
+    file2 = mkfile(new_temp_dir, 'file2', content='file2')
+    folder1 = mkdir(new_temp_dir, 'folder1')
+    mkfile(folder1, 'file3', content='file3')
+
+    SynapseUploader(new_syn_project.id, new_temp_dir, mirror=True).execute()
+
+    syn_files, _ = get_syn_files(syn_client, new_syn_project)
+    syn_file1 = find_by_name(syn_files, 'file1')
+    syn_folders, _ = get_syn_folders(syn_client, new_syn_project)
+    syn_file3 = find_by_name(get_syn_files(syn_client, find_by_name(syn_folders, 'folder1'))[0], 'file3')
+
+    os.rename(file1, os.path.join(new_temp_dir, 'file1-renamed'))
+    os.remove(file2)
+    os.rename(folder1, os.path.join(new_temp_dir, 'folder2'))
+
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, mirror=True, trash=True).execute()
+    assert not syn_uploader.errors
+
     syn_files, syn_file_names = get_syn_files(syn_client, new_syn_project)
-    assert len(syn_files) == 2
-    assert syn_file_names == ['file1', 'file2']
     syn_folders, syn_folder_names = get_syn_folders(syn_client, new_syn_project)
-    assert len(syn_folders) == 1
-    assert syn_folder_names == ['more']
+    assert syn_file_names == ['file1-renamed']
+    assert syn_folder_names == ['folder2']
+    # Moved files keep their entity.
+    assert find_by_name(syn_files, 'file1-renamed')['id'] == syn_file1['id']
+    assert syn_client.get(syn_file1['id'], downloadFile=False)['_file_handle']['fileName'] == 'file1-renamed'
 
-    more_folder = find_by_name(syn_folders, 'more')
+    syn_files, syn_file_names = get_syn_files(syn_client, find_by_name(syn_folders, 'folder2'))
+    assert syn_file_names == ['file3']
+    assert find_by_name(syn_files, 'file3')['id'] == syn_file3['id']
 
-    syn_files, syn_file_names = get_syn_files(syn_client, more_folder)
-    assert len(syn_files) == 2
-    assert syn_file_names == ['file3', 'file4']
-    syn_folders, syn_folder_names = get_syn_folders(syn_client, more_folder)
-    assert len(syn_folders) == 1
-    assert syn_folder_names == ['more']
 
-    more_folder = find_by_name(syn_folders, 'more')
+def test_upload_duplicate_content(syn_client, new_syn_project, new_temp_dir):
+    """
+        Tests this scenario:
 
-    syn_files, syn_file_names = get_syn_files(syn_client, more_folder)
-    assert len(syn_files) == 1
-    assert syn_file_names == ['file5']
-    syn_folders, syn_folder_names = get_syn_folders(syn_client, more_folder)
-    assert len(syn_folders) == 2
-    assert syn_folder_names == ['folder1', 'more']
+        file1
+        folder1/
+            file2 (same content as file1)
+        """
+    content = str(uuid.uuid4())
+    mkfile(new_temp_dir, 'file1', content=content)
+    folder1 = mkdir(new_temp_dir, 'folder1')
+    mkfile(folder1, 'file2', content=content)
 
-    more_folder = find_by_name(syn_folders, 'more')
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir).execute()
+    assert not syn_uploader.errors
 
-    syn_folder1 = find_by_name(syn_folders, 'folder1')
+    syn_files, _ = get_syn_files(syn_client, new_syn_project)
+    syn_folders, _ = get_syn_folders(syn_client, new_syn_project)
+    syn_file1 = syn_client.get(find_by_name(syn_files, 'file1')['id'], downloadFile=False)
+    syn_files, _ = get_syn_files(syn_client, find_by_name(syn_folders, 'folder1'))
+    syn_file2 = syn_client.get(find_by_name(syn_files, 'file2')['id'], downloadFile=False)
+    assert syn_file1['_file_handle']['contentMd5'] == syn_file2['_file_handle']['contentMd5']
+    assert syn_file2['_file_handle']['fileName'] == 'file2'
 
-    child_syn_files, child_syn_file_names = get_syn_files(syn_client, syn_folder1)
-    assert len(child_syn_files) == 2
-    assert child_syn_file_names == ['file1-1', 'file1-2']
-    child_syn_folders, _ = get_syn_folders(syn_client, syn_folder1)
-    assert len(child_syn_folders) == 0
-
-    syn_files, _ = get_syn_files(syn_client, more_folder)
-    assert len(syn_files) == 0
-    syn_folders, syn_folder_names = get_syn_folders(syn_client, more_folder)
-    assert len(syn_folders) == 3
-    assert syn_folder_names == ['folder2', 'folder3', 'more']
-
-    more_folder = find_by_name(syn_folders, 'more')
-
-    syn_files, _ = get_syn_files(syn_client, more_folder)
-    assert len(syn_files) == 0
-    syn_folders, syn_folder_names = get_syn_folders(syn_client, more_folder)
-    assert len(syn_folders) == 2
-    assert syn_folder_names == ['folder4', 'folder5']
+
+def test_upload_packed(syn_client, new_syn_project, new_temp_dir):
+    """
+        Tests this scenario:
+
+        file1 (small)
+        file2 (small)
+        file3 (small)
+        file4 (large)
+
+        TO:
+
+        file4
+        packed-files-0001.tar (file1, file2)
+        packed-files-0002.tar (file3)
+        """
+    for i in range(1, 4):
+        mkfile(new_temp_dir, 'file{0}'.format(i), content='x' * 10)
+    mkfile(new_temp_dir, 'file4', content='x' * 100)
+
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, pack_threshold=50, pack_size=20).execute()
+    assert not syn_uploader.errors
+
+    syn_files, syn_file_names = get_syn_files(syn_client, new_syn_project)
+    assert syn_file_names == ['file4', 'packed-files-0001.tar', 'packed-files-0002.tar']
+    syn_file = syn_client.get(find_by_name(syn_files, 'packed-files-0001.tar')['id'], downloadFile=False)
+    assert syn_file['packedFileCount'] == [2]
+
+    # Unchanged archives are current.
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, pack_threshold=50, pack_size=20).execute()
+    assert not syn_uploader.errors
+    assert syn_client.get(syn_file.id, downloadFile=False).versionNumber == syn_file.versionNumber
+
+
+def test_upload_files_from(syn_client, new_syn_project, new_temp_dir):
+    """
+        Tests this scenario:
+
+        file1 (listed)
+        file2
+        folder1/
+            folder2/
+                file3 (listed)
+
+        TO:
+
+        file1
+        folder1/
+            folder2/
+                file3
+        """
+    file1 = mkfile(new_temp_dir, 'file1')
+    mkfile(new_temp_dir, 'file2')
+    folder2 = mkdir(mkdir(new_temp_dir, 'folder1'), 'folder2')
+    mkfile(folder2, 'file3')
+
+    files_from = mkfile(new_temp_dir, 'files_from',
+                        content='\n'.join([file1, os.path.join('folder1', 'folder2', 'file3')]))
+
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, files_from=files_from).execute()
+    assert not syn_uploader.errors
+
+    _, syn_file_names = get_syn_files(syn_client, new_syn_project)
+    syn_folders, syn_folder_names = get_syn_folders(syn_client, new_syn_project)
+    assert syn_file_names == ['file1']
+    assert syn_folder_names == ['folder1']
+
+    syn_folders, syn_folder_names = get_syn_folders(syn_client, find_by_name(syn_folders, 'folder1'))
+    assert syn_folder_names == ['folder2']
+    _, syn_file_names = get_syn_files(syn_client, find_by_name(syn_folders, 'folder2'))
+    assert syn_file_names == ['file3']
+
+
+def test_upload_files_from_paths(mocker, new_temp_dir):
+    local_path = mkdir(new_temp_dir, 'local')
+    hidden_file = mkfile(local_path, '..hidden.txt')
+    var_file = mkfile(local_path, '$HOME~.txt')
+    mkfile(new_temp_dir, 'outside.txt')
+    files_from = mkfile(new_temp_dir, 'files_from',
+                        content='\n'.join(['..hidden.txt', '$HOME~.txt', os.path.join(os.pardir, 'outside.txt')]))
+    mock_submit_files = mocker.patch.object(SynapseUploader, '_submit_files')
+    mocker.patch.object(SynapseUploader, '_list_synapse_children', return_value=[])
+
+    syn_uploader = SynapseUploader('syn1', local_path, files_from=files_from)
+    syn_uploader._upload_files_from(None, {'id': 'syn1'})
+
+    # Names starting with ".." are in the local path and variables are not expanded in names.
+    mock_submit_files.assert_called_once_with(None, [(hidden_file, os.path.getsize(hidden_file)),
+                                                     (var_file, os.path.getsize(var_file))], {'id': 'syn1'})
+    assert syn_uploader.errors == ['File is not in the local path: {0}'.format(os.path.join(new_temp_dir,
+                                                                                            'outside.txt'))]
+
+
+def test_upload_files_from_max_depth(mocker, new_temp_dir):
+    syn_project = syn.Project(name='Project', id='syn1')
+    local_path = mkdir(new_temp_dir, 'local')
+    file1 = mkfile(local_path, 'file1')
+    file2 = mkfile(local_path, 'file2')
+    file3 = mkfile(local_path, 'file3')
+    file4 = mkfile(mkdir(local_path, 'folder1'), 'file4')
+    files_from = mkfile(new_temp_dir, 'files_from',
+                        content='\n'.join(['file1', os.path.join('folder1', 'file4'), 'file2', 'file3']))
+    folder_type = 'org.sagebionetworks.repo.model.Folder'
+    file_type = 'org.sagebionetworks.repo.model.FileEntity'
+    children = {
+        'syn1': [{'name': 'more_0001', 'id': 'syn2', 'type': folder_type}],
+        'syn2': [{'name': 'file1', 'id': 'syn3', 'type': file_type},
+                 {'name': 'file2', 'id': 'syn4', 'type': file_type}]
+    }
+    mocker.patch.object(SynapseUploader, '_list_synapse_children', side_effect=lambda parent_id: children[parent_id])
+
+    def store(entity, **kwargs):
+        entity.id = 'syn5'
+        return entity
+
+    mock_store = mocker.patch.object(Synapsis.Synapse, 'store', side_effect=store)
+    mock_submit_files = mocker.patch.object(SynapseUploader, '_submit_files')
+
+    syn_uploader = SynapseUploader(syn_project.id, local_path, max_depth=10, files_from=files_from)
+    syn_uploader._upload_files_from(None, syn_project)
+
+    # The files and folders go in the existing overflow folder, only folder1 is created.
+    submitted = [(parent_files, synapse_parent.id) for (_, parent_files, synapse_parent), _ in
+                 mock_submit_files.call_args_list]
+    assert submitted == [
+        ([(file1, os.path.getsize(file1))], 'syn2'),
+        ([(file4, os.path.getsize(file4))], 'syn5'),
+        ([(file2, os.path.getsize(file2)), (file3, os.path.getsize(file3))], 'syn2')
+    ]
+    assert mock_store.call_count == 1
+    assert mock_store.call_args.args[0].parentId == 'syn2'
+    assert not syn_uploader.errors
+
+    # Files that do not fit in a full folder are not uploaded.
+    children['syn1'] = [{'name': 'file1', 'id': 'syn3', 'type': file_type},
+                        {'name': 'file2', 'id': 'syn4', 'type': file_type}]
+    mock_submit_files.reset_mock()
+    syn_uploader = SynapseUploader(syn_project.id, local_path, max_depth=2, files_from=files_from)
+    syn_uploader._upload_files_from(None, syn_project)
+
+    # The files in a folder that does not fit are submitted without a parent and fail.
+    assert [(parent_files, synapse_parent and synapse_parent.id) for (_, parent_files, synapse_parent), _ in
+            mock_submit_files.call_args_list] == [
+        ([(file1, os.path.getsize(file1))], 'syn1'),
+        ([(file4, os.path.getsize(file4))], None),
+        ([(file2, os.path.getsize(file2))], 'syn1')
+    ]
+    assert syn_uploader.errors == [
+        '[Folder FAILED] {0} : More than 2 files and folders in: {1}'.format(os.path.join(local_path, 'folder1'),
+                                                                             local_path),
+        '[File FAILED] {0} : More than 2 files and folders in: {1}'.format(file3, local_path)
+    ]
+
+
+def test_upload_filtered(syn_client, new_syn_project, new_temp_dir):
+    """
+        Tests this scenario:
+
+        file1.txt
+        file2.tmp (excluded)
+        __pycache__/ (excluded)
+            file3.pyc
+        folder1/
+            file4.txt
+
+        TO:
+
+        file1.txt
+        folder1/
+            file4.txt
+        """
+    mkfile(new_temp_dir, 'file1.txt')
+    mkfile(new_temp_dir, 'file2.tmp')
+    mkfile(mkdir(new_temp_dir, '__pycache__'), 'file3.pyc')
+    mkfile(mkdir(new_temp_dir, 'folder1'), 'file4.txt')
+    excludes = ['*.tmp', '__pycache__/']
+
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, excludes=excludes).execute()
+    assert not syn_uploader.errors
+
+    _, syn_file_names = get_syn_files(syn_client, new_syn_project)
+    syn_folders, syn_folder_names = get_syn_folders(syn_client, new_syn_project)
+    assert syn_file_names == ['file1.txt']
+    assert syn_folder_names == ['folder1']
+    _, syn_file_names = get_syn_files(syn_client, find_by_name(syn_folders, 'folder1'))
+    assert syn_file_names == ['file4.txt']
+
+    # Excluded files and folders already in Synapse are not trashed when mirroring.
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir).execute()
+    assert not syn_uploader.errors
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, excludes=excludes, mirror=True,
+                                   trash=True).execute()
+    assert not syn_uploader.errors
+
+    _, syn_file_names = get_syn_files(syn_client, new_syn_project)
+    _, syn_folder_names = get_syn_folders(syn_client, new_syn_project)
+    assert syn_file_names == ['file1.txt', 'file2.tmp']
+    assert syn_folder_names == ['__pycache__', 'folder1']
+
+
+def test_upload_manifest(syn_client, new_syn_project, new_temp_dir, tmp_path):
+    file1 = mkfile(new_temp_dir, 'file1')
+    file2 = mkfile(mkdir(new_temp_dir, 'folder1'), 'file2')
+    empty_file = mkfile(new_temp_dir, 'file3', content='')
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, manifest_path=manifest_path).execute()
+    assert not syn_uploader.errors
+
+    with open(manifest_path) as fd:
+        records = {r['local_path']: r for r in (json.loads(line) for line in fd)}
+    assert set(records.keys()) == {file1, file2, empty_file}
+
+    syn_files, _ = get_syn_files(syn_client, new_syn_project)
+    record = records[file1]
+    assert record['status'] == 'uploaded'
+    assert record['synapse_id'] == find_by_name(syn_files, 'file1')['id']
+    assert record['parent_id'] == new_syn_project.id
+    assert record['version'] == 1
+    assert record['size'] == os.path.getsize(file1)
+    assert record['md5'] == Utils.get_md5(file1)
+    assert record['seconds'] >= 0
+    assert records[empty_file]['status'] == 'skipped'
+
+    # Unchanged files are current.
+    syn_uploader = SynapseUploader(new_syn_project.id, new_temp_dir, manifest_path=manifest_path).execute()
+    assert not syn_uploader.errors
+    with open(manifest_path) as fd:
+        records = {r['local_path']: r for r in (json.loads(line) for line in fd)}
+    assert records[file1]['status'] == 'current'
+    assert records[file2]['status'] == 'current'
+
+
+@pytest.fixture()
+def mock_synapse_storage(mocker):
+    """Mocks uploading to Synapse storage and storing entities. Returns the _multipart_upload mock."""
+    mocker.patch.object(SynapseUploader, '_get_upload_destination',
+                        return_value={'concreteType': concrete_types.SYNAPSE_S3_UPLOAD_DESTINATION,
+                                      'storageLocationId': 1})
+    mocker.patch.object(SynapseUploader, '_retry_sleep')
+    mocker.patch.object(Synapsis.Synapse, 'store', side_effect=lambda entity, **kwargs: entity)
+    mocker.patch.object(Synapsis.Synapse, 'cache')
+    return mocker.patch('synapseclient.core.upload.multipart_upload._multipart_upload', return_value='123')
+
+
+def test_upload_changed_file_hashed_once(mocker, mock_synapse_storage, new_temp_dir):
+    local_file = mkfile(new_temp_dir, 'file1', content='new')
+    syn_project = syn.Project(name='Project', id='syn1')
+    remote_file = syn.File(name='file1', parent=syn_project, id='syn2')
+    remote_file['_file_handle'] = {'contentSize': 3, 'contentMd5': 'old', 'fileName': 'file1'}
+    mocker.patch.object(SynapseUploader, '_find_synapse_file', return_value=remote_file)
+    mock_get_md5 = mocker.spy(Utils, 'get_md5')
+    # The first upload fails and is retried.
+    mock_synapse_storage.side_effect = [Exception('Upload failed'), '123']
+
+    syn_uploader = SynapseUploader(syn_project.id, new_temp_dir)
+    syn_file = syn_uploader._upload_file_to_synapse(local_file, 3, syn_project, {'name': 'file1', 'id': 'syn2'})
+
+    assert not syn_uploader.errors
+    assert syn_file.dataFileHandleId == '123'
+    assert mock_synapse_storage.call_count == 2
+    mock_get_md5.assert_called_once_with(local_file)
+
+    # New files are hashed once too.
+    mock_get_md5.reset_mock()
+    mock_synapse_storage.side_effect = [Exception('Upload failed'), '456']
+    local_file = mkfile(new_temp_dir, 'file2', content='new file')
+    syn_file = syn_uploader._upload_file_to_synapse(local_file, 8, syn_project, None)
+
+    assert not syn_uploader.errors
+    assert syn_file.dataFileHandleId == '456'
+    mock_get_md5.assert_called_once_with(local_file)
+
+
+def test_upload_duplicate_content_renamed(mocker, mock_synapse_storage, new_temp_dir):
+    syn_project = syn.Project(name='Project', id='syn1')
+    file1 = mkfile(new_temp_dir, 'file1', content='same')
+    file2 = mkfile(new_temp_dir, 'file2', content='same')
+    folder1 = mkdir(new_temp_dir, 'folder1')
+    file1_copy = mkfile(folder1, 'file1', content='same')
+    file2_copy = mkfile(folder1, 'file2', content='same')
+    mock_copy = mocker.patch.object(SynapseUploader, '_copy_file_handle', return_value='456')
+
+    syn_uploader = SynapseUploader(syn_project.id, new_temp_dir)
+    syn_file1 = syn_uploader._upload_file_to_synapse(file1, 4, syn_project, None)
+    syn_file2 = syn_uploader._upload_file_to_synapse(file2, 4, syn_project, None)
+    syn_file1_copy = syn_uploader._upload_file_to_synapse(file1_copy, 4, syn_project, None)
+    syn_file2_copy = syn_uploader._upload_file_to_synapse(file2_copy, 4, syn_project, None)
+
+    assert not syn_uploader.errors
+    assert mock_synapse_storage.call_count == 1
+    # Files with the same name reuse the file handle, other names get one renamed copy.
+    assert syn_file1.dataFileHandleId == '123'
+    assert syn_file1_copy.dataFileHandleId == '123'
+    assert syn_file2.dataFileHandleId == '456'
+    assert syn_file2_copy.dataFileHandleId == '456'
+    mock_copy.assert_called_once_with(syn_file1, 'file2')
+
+
+def test_upload_file_handle_throttled(mock_synapse_storage, new_temp_dir):
+    data = b'0123456789' * 1000
+    syn_uploader = SynapseUploader('syn1', new_temp_dir, bandwidth_limit=1024 * 1024)
+    file_handle_id = syn_uploader._upload_file_handle('file1', len(data), hashlib.md5(data).hexdigest(), 1,
+                                                      lambda offset, length: data[offset:offset + length])
+    assert file_handle_id == '123'
+
+    # The part is sent in chunks that each wait on the bandwidth limiter.
+    _, _, _, part_fn, md5_fn = mock_synapse_storage.call_args.args
+    part = part_fn(1)
+    assert isinstance(part, UploadBody)
+    assert b''.join(part) == data
+    assert md5_fn(part, None) == hashlib.md5(data).hexdigest()
+
+
+def test_join_synapse_files(mocker, mock_synapse_storage, new_temp_dir):
+    syn_project = syn.Project(name='Project', id='syn1')
+    new_file = mkfile(new_temp_dir, 'new', content='new')
+    empty_file = mkfile(new_temp_dir, 'empty', content='')
+    existing_file = mkfile(new_temp_dir, 'existing', content='changed')
+
+    synapse_child = {'name': 'existing', 'id': 'syn3'}
+    remote_file = syn.File(name='existing', parent=syn_project, id='syn3')
+    remote_file['_file_handle'] = {'contentSize': 7, 'contentMd5': 'old', 'fileName': 'existing'}
+    mocker.patch.object(SynapseUploader, '_list_synapse_children',
+                        return_value=[synapse_child, {'name': 'other', 'id': 'syn4'}])
+    mock_get = mocker.patch.object(Synapsis.Synapse, 'get', return_value=remote_file)
+    mock_find = mocker.spy(SynapseUploader, '_find_synapse_file')
+
+    syn_uploader = SynapseUploader(syn_project.id, new_temp_dir)
+    local_files = [(new_file, 3), (empty_file, 0), (existing_file, 7)]
+    joined = list(syn_uploader._join_synapse_files(local_files, syn_project))
+
+    # Empty files are skipped and only files with a name match have a Synapse child.
+    assert joined == [(new_file, 3, None), (existing_file, 7, synapse_child)]
+
+    # The existing file's upload fails once and is retried.
+    mock_synapse_storage.side_effect = ['123', Exception('Upload failed'), '456']
+    for local_file, local_file_size, child in joined:
+        assert syn_uploader._upload_file_to_synapse(local_file, local_file_size, syn_project, child)
+    assert not syn_uploader.errors
+
+    # The new file never looks up a remote file, the existing file fetches its remote file once.
+    mock_find.assert_called_once_with(syn_uploader, syn_project.id, existing_file, synapse_child=synapse_child)
+    mock_get.assert_called_once_with('syn3', downloadFile=False)
+
+
+
+def test_create_folder_in_synapse_listing(mocker):
+    syn_project = syn.Project(name='Project', id='syn1')
+    listings = {'syn1': [{'name': 'existing', 'id': 'syn2', 'type': 'org.sagebionetworks.repo.model.Folder'},
+                         {'name': 'file1', 'id': 'syn3', 'type': 'org.sagebionetworks.repo.model.FileEntity'}]}
+    mock_list = mocker.patch.object(SynapseUploader, '_list_synapse_children',
+                                    side_effect=lambda parent_id: listings[parent_id])
+
+    def store(entity, **kwargs):
+        entity.id = 'syn4'
+        return entity
+
+    mock_store = mocker.patch.object(Synapsis.Synapse, 'store', side_effect=store)
+
+    syn_uploader = SynapseUploader(syn_project.id, 'None')
+    existing_folder = syn_uploader._create_folder_in_synapse('existing', syn_project)
+    new_folder = syn_uploader._create_folder_in_synapse('new', syn_project)
+
+    # The existing folder is not stored again and only the new folder is stored.
+    assert (existing_folder.id, existing_folder.parentId) == ('syn2', 'syn1')
+    assert new_folder.id == 'syn4'
+    assert mock_store.call_count == 1
+
+    # The new folder is known to be empty and is never listed.
+    assert list(syn_uploader._join_synapse_files([('new/file2', 3)], new_folder)) == [('new/file2', 3, None)]
+    mock_list.assert_called_once_with('syn1')
+    assert not syn_uploader.errors
+
+def test_pack_files_broken_symlink(new_temp_dir, tmp_path):
+    file1 = mkfile(new_temp_dir, 'file1', content='abc')
+    broken_link = os.path.join(new_temp_dir, 'link')
+    os.symlink(os.path.join(new_temp_dir, 'missing'), broken_link)
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+
+    syn_uploader = SynapseUploader('syn1', new_temp_dir, manifest_path=manifest_path)
+    syn_uploader._path_filter = PathFilter(min_size=1)
+    dirs, files, _ = syn_uploader._get_dirs_and_files(new_temp_dir)
+    assert [f.name for f in files] == ['file1', 'link']
+
+    syn_uploader._manifest.open()
+    local_files, _ = syn_uploader._pack_files(new_temp_dir, files, None)
+    syn_uploader._manifest.close()
+
+    # The broken link is reported and the walk continues.
+    assert local_files == [(file1, 3)]
+    assert len(syn_uploader.errors) == 1 and broken_link in syn_uploader.errors[0]
+    with open(manifest_path) as fd:
+        records = [json.loads(line) for line in fd]
+    assert [(r['local_path'], r['status']) for r in records] == [(broken_link, 'failed')]
+
+
+def test_mirror_hash_failure(mocker, new_temp_dir):
+    """
+        Tests a local rename a -> b where b cannot be read: a is not trashed and the run has errors.
+        """
+    syn_project = syn.Project(name='Project', id='syn1')
+    local_file = mkfile(new_temp_dir, 'b', content='abc')
+    remote_file = syn.File(name='a', parent=syn_project, id='syn2')
+    remote_file['_file_handle'] = {'contentSize': 3, 'contentMd5': Utils.get_md5(local_file), 'fileName': 'a'}
+
+    mocker.patch.object(SynapseUploader, '_get_mirror_file', return_value=remote_file)
+    mocker.patch.object(SynapseUploader, '_get_md5', side_effect=PermissionError('Permission denied'))
+    mock_move = mocker.patch.object(SynapseUploader, '_move_file_in_synapse')
+    mock_trash = mocker.patch.object(SynapseUploader, '_trash_in_synapse')
+
+    syn_uploader = SynapseUploader(syn_project.id, new_temp_dir, mirror=True, trash=True)
+    syn_uploader._scheduler = UploadScheduler(new_temp_dir)
+    syn_uploader._mirror_orphan_files.append({'name': 'a', 'id': 'syn2'})
+    syn_uploader._mirror_new_files.append((local_file, 3, syn_project))
+    syn_uploader._mirror_folder()
+
+    assert any('[File FAILED] {0}'.format(local_file) in e and 'Permission denied' in e for e in syn_uploader.errors)
+    mock_move.assert_not_called()
+    mock_trash.assert_not_called()
+
+
+def test_upload_manifest_failed(mocker, new_temp_dir, tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    mocker.patch.object(Synapsis.Synapse, 'get', return_value=syn.Project(name='Project', id='syn1'))
+    mocker.patch.object(SynapseUploader, '_upload_folder',
+                        side_effect=lambda *args: syn_uploader._write_manifest('uploaded', 'file1', 1))
+    mocker.patch.object(ManifestWriter, '_write_records', side_effect=OSError('No space left on device'))
+
+    syn_uploader = SynapseUploader('syn1', new_temp_dir, manifest_path=manifest_path)
+    syn_uploader.execute()
+
+    assert syn_uploader.errors == ['Cannot write manifest: {0} : No space left on device'.format(manifest_path)]
+
+
+
+def test_upload_folder_manifest_failed(mocker, new_temp_dir, tmp_path):
+    syn_project = syn.Project(name='Project', id='syn1')
+    file1 = mkfile(new_temp_dir, 'file1')
+    folder1 = mkdir(new_temp_dir, 'folder1')
+    file2 = mkfile(folder1, 'file2')
+    file3 = mkfile(mkdir(folder1, 'folder2'), 'file3')
+    mocker.patch.object(SynapseUploader, '_retry_sleep')
+    mock_list = mocker.patch.object(SynapseUploader, '_list_synapse_children', side_effect=Exception('Listing failed'))
+    mocker.patch.object(Synapsis.Synapse, 'store', side_effect=Exception('Forbidden'))
+    mocker.patch.object(SynapseUploader, '_submit_files')
+
+    def upload_folder(synapse_parent):
+        manifest_path = str(tmp_path / 'manifest-{0}.jsonl'.format(uuid.uuid4()))
+        syn_uploader = SynapseUploader(syn_project.id, new_temp_dir, manifest_path=manifest_path)
+        syn_uploader._manifest.open()
+        syn_uploader._upload_folder(None, new_temp_dir, synapse_parent)
+        syn_uploader._manifest.close()
+        with open(manifest_path) as fd:
+            return [(r['local_path'], r['status'], r['error']) for r in (json.loads(line) for line in fd)]
+
+    # Every file under a folder that cannot be uploaded has a failed record.
+    assert upload_folder(None) == [(f, 'failed', 'Parent not found') for f in [file1, file2, file3]]
+    assert upload_folder(syn_project) == [(f, 'failed', 'Cannot get overflow folders') for f in [file1, file2, file3]]
+
+    # The files in a folder that cannot be created.
+    mock_list.side_effect = None
+    mock_list.return_value = []
+    assert upload_folder(syn_project) == [(f, 'failed', 'Parent not found') for f in [file2, file3]]
+
+def test_trash_manifest(mocker, tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    mocker.patch.object(SynapseUploader, '_retry_sleep')
+
+    def delete(entity_id):
+        if entity_id == 'syn3':
+            raise Exception('Forbidden')
+
+    mocker.patch.object(Synapsis.Synapse, 'delete', side_effect=delete)
+
+    syn_uploader = SynapseUploader('syn1', 'None', mirror=True, trash=True, manifest_path=manifest_path)
+    syn_uploader._manifest.open()
+    syn_uploader._trash_in_synapse({'name': 'file1', 'id': 'syn2'})
+    syn_uploader._trash_in_synapse({'name': 'file2', 'id': 'syn3'})
+    syn_uploader._manifest.close()
+
+    with open(manifest_path) as fd:
+        records = {r['synapse_id']: r for r in (json.loads(line) for line in fd)}
+    assert records['syn2']['status'] == 'trashed'
+    assert records['syn2']['local_path'] is None
+    assert records['syn3']['status'] == 'failed'
+    assert records['syn3']['error'] == 'Forbidden'
+    assert len(syn_uploader.errors) == 1
 
 
 def test_upload_failures():
@@ -0,0 +1,75 @@
+import time
+import threading
+import http.server
+import requests
+from synapse_uploader.upload_body import UploadBody
+from synapse_uploader.bandwidth_limiter import BandwidthLimiter
+from synapse_uploader.profiler import Profiler
+
+
+def test_iter(mocker):
+    limiter = BandwidthLimiter(rate=1024 * 1024)
+    mock_acquire = mocker.patch.object(limiter, 'acquire')
+    data = bytes(range(256)) * 1000
+    body = UploadBody(data, limiter, chunk_size=64 * 1024)
+
+    assert len(body) == len(data)
+    assert b''.join(body) == data
+    assert [c.args[0] for c in mock_acquire.call_args_list] == [65536, 65536, 65536, 59392]
+
+    # The body can be sent again.
+    assert b''.join(body) == data
+
+
+def test_throttle():
+    limiter = BandwidthLimiter(rate=100 * 1024)
+    profiler = Profiler()
+    body = UploadBody(b'x' * 150 * 1024, limiter, profiler=profiler, chunk_size=10 * 1024)
+
+    start = time.monotonic()
+    chunk_times = []
+    for _ in body:
+        chunk_times.append(time.monotonic() - start)
+
+    # The limit holds while the part is sent, not only between parts.
+    assert 1.3 <= chunk_times[-1] < 2.2
+    assert chunk_times[7] < chunk_times[-1] - 0.5
+    elapsed = time.monotonic() - start
+
+    # Waiting on the limiter is not nested in sending.
+    report = profiler.get_report()
+    assert 'throttle' in report and 'upload' in report
+    stats = profiler._stats
+    assert stats['throttle']['calls'] == stats['upload']['calls'] == 15
+    assert stats['throttle']['thread'] + stats['upload']['thread'] <= elapsed
+
+
+def test_requests_put():
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_PUT(self):
+            received.append((self.headers.get('Content-Length'), self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        data = b'0123456789' * 20000
+        body = UploadBody(data, BandwidthLimiter(rate=10 * 1024 * 1024))
+        url = 'http://127.0.0.1:{0}/part'.format(server.server_port)
+        with requests.Session() as session:
+            # Sent with a Content-Length, not chunked, and sent whole again on a retry.
+            for _ in range(2):
+                assert session.put(url, body).status_code == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert received == [(str(len(data)), data)] * 2
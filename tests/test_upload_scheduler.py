@@ -0,0 +1,72 @@
+import os
+import threading
+import concurrent.futures
+import pytest
+from synapse_uploader.upload_scheduler import UploadScheduler
+
+LOCAL_PATH = os.path.join(os.sep, 'data')
+
+
+def run_uploads(scheduler, uploads):
+    """Submits the uploads while the only thread is busy and returns the order they ran in."""
+    ran = []
+    blocker = threading.Event()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(blocker.wait)
+        for relative_path, size, mtime in uploads:
+            local_file = os.path.join(LOCAL_PATH, relative_path)
+            scheduler.submit(executor, local_file, size, ran.append, relative_path, mtime=mtime)
+        blocker.set()
+
+    return ran
+
+
+UPLOADS = [
+    ('a/one.txt', 30, 1),
+    ('a/two.json', 10, 3),
+    ('a/three.txt', 20, 2),
+    ('b/one.txt', 50, 5),
+    ('b/two.txt', 40, 4),
+]
+
+
+def test_is_fifo():
+    assert UploadScheduler(LOCAL_PATH).is_fifo
+    assert not UploadScheduler(LOCAL_PATH, order='smallest').is_fifo
+    assert not UploadScheduler(LOCAL_PATH, priorities=['*.json']).is_fifo
+    assert not UploadScheduler(LOCAL_PATH, fair=True).is_fifo
+
+
+def test_invalid_order():
+    with pytest.raises(ValueError):
+        UploadScheduler(LOCAL_PATH, order='random')
+
+
+def test_order():
+    assert run_uploads(UploadScheduler(LOCAL_PATH), UPLOADS) == [u[0] for u in UPLOADS]
+
+    assert run_uploads(UploadScheduler(LOCAL_PATH, order='smallest'), UPLOADS) == [
+        'a/two.json', 'a/three.txt', 'a/one.txt', 'b/two.txt', 'b/one.txt']
+
+    assert run_uploads(UploadScheduler(LOCAL_PATH, order='largest'), UPLOADS) == [
+        'b/one.txt', 'b/two.txt', 'a/one.txt', 'a/three.txt', 'a/two.json']
+
+    assert run_uploads(UploadScheduler(LOCAL_PATH, order='newest'), UPLOADS) == [
+        'b/one.txt', 'b/two.txt', 'a/two.json', 'a/three.txt', 'a/one.txt']
+
+
+def test_priorities():
+    scheduler = UploadScheduler(LOCAL_PATH, priorities=['*.json', 'b/*'])
+    assert run_uploads(scheduler, UPLOADS) == [
+        'a/two.json', 'b/one.txt', 'b/two.txt', 'a/one.txt', 'a/three.txt']
+
+
+def test_fair():
+    scheduler = UploadScheduler(LOCAL_PATH, fair=True)
+    assert run_uploads(scheduler, UPLOADS) == [
+        'a/one.txt', 'b/one.txt', 'a/two.json', 'b/two.txt', 'a/three.txt']
+
+    scheduler = UploadScheduler(LOCAL_PATH, order='smallest', fair=True)
+    assert run_uploads(scheduler, UPLOADS) == [
+        'a/two.json', 'b/two.txt', 'a/three.txt', 'b/one.txt', 'a/one.txt']
@@ -0,0 +1,38 @@
+import io
+import time
+from datetime import datetime
+import pytest
+from synapse_uploader.utils import Utils
+
+
+def test_read_paths():
+    assert list(Utils.read_paths(io.StringIO('one\ntwo three\n\nfour/five\r\n'))) == \
+           ['one', 'two three', 'four/five']
+
+    assert list(Utils.read_paths(io.StringIO('one\0two\nthree\0\0four'), null_separated=True)) == \
+           ['one', 'two\nthree', 'four']
+
+
+def test_parse_time():
+    now = time.time()
+    assert abs(Utils.parse_time('30s') - (now - 30)) < 5
+    assert abs(Utils.parse_time('12h') - (now - 12 * 60 * 60)) < 5
+    assert abs(Utils.parse_time('7D') - (now - 7 * 24 * 60 * 60)) < 5
+    assert Utils.parse_time('2024-01-31') == datetime(2024, 1, 31).timestamp()
+    assert Utils.parse_time('2024-01-31T12:30:00') == datetime(2024, 1, 31, 12, 30).timestamp()
+
+    for value in ['', 'soon', '10Q', '2024-13-01']:
+        with pytest.raises(ValueError):
+            Utils.parse_time(value)
+
+
+def test_parse_size():
+    assert Utils.parse_size('512') == 512
+    assert Utils.parse_size(512) == 512
+    assert Utils.parse_size('64K') == 64 * Utils.KB
+    assert Utils.parse_size('10mb') == 10 * Utils.MB
+    assert Utils.parse_size('1.5G') == int(1.5 * Utils.GB)
+
+    for value in ['', 'ten', '10Q']:
+        with pytest.raises(ValueError):
+            Utils.parse_size(value)